@@ -33,13 +33,21 @@ from bpy.props import StringProperty, IntProperty, BoolProperty
 from bpy.app.handlers import persistent
 
 import sys, subprocess, os, site, platform
-import json
-import shutil
-import requests
 import math
 import audioop
+import threading
+import collections
+import uuid
+import copy
+import tempfile
 from datetime import datetime
 
+from .workers import PipeWriter, WebhookDispatcher, DesktopNotifier, PreviewWorker, ReadinessWatcher
+from .outbox import Outbox
+from . import ipc_protocol
+from . import preview
+from .render_stats import FrameStats, ETAEngine, FrameTimeline, QuantileSketch, MAX_TIMELINE_FRAMES, format_duration
+
 import discord
 from notifypy import Notify as NotifyClass
 from discord import Webhook as DiscordWebhookClass, Embed as DiscordEmbedClass
@@ -199,6 +207,39 @@ class Render_Notifications_Properties(PropertyGroup):
         description="Enable render notifications.",
         default=False
     ) # type: ignore
+    eta_method: bpy.props.EnumProperty(
+        name="ETA estimate",
+        description="How the remaining render time of animations is estimated",
+        items=[
+            ('TRIMMED_MEAN', "Trimmed Mean", "Mean of the last 50 frames without the slowest and fastest 10%"),
+            ('EMA', "Moving Average", "Exponential moving average, follows gradual changes in frame time"),
+            ('TREND', "Linear Trend", "Fits a line to frame time over the shot, for shots that get heavier or lighter"),
+            ('LAST', "Last Frame", "Every frame left takes as long as the last one"),
+        ],
+        default='TRIMMED_MEAN'
+    ) # type: ignore
+    eta_warmup: bpy.props.IntProperty(
+        name="Warm-up frames",
+        description="Frames left out of the ETA once later frames are rendered, the first frame includes BVH building and kernel compiling",
+        default=1,
+        min=0
+    ) # type: ignore
+    slow_frame_alert: bpy.props.BoolProperty(
+        name="Slow frame alerts",
+        description="Notify every enabled notifier right away when a frame takes much longer than the median frame time. This sends alerts even when the other per-event notifications are turned off",
+        default=False
+    ) # type: ignore
+    slow_frame_factor: bpy.props.FloatProperty(
+        name="Slow frame factor",
+        description="A frame is slow when it takes longer than this many times the running median",
+        default=3.0,
+        min=1.1
+    ) # type: ignore
+    export_frame_times: bpy.props.BoolProperty(
+        name="Export frame times",
+        description="Save every frame's start, end and render time as CSV and JSON in the preview folder when an animation completes or is canceled. Check that the preview folder exists on this system",
+        default=False
+    ) # type: ignore
     
     #desktop notifications
     desktop_start: bpy.props.BoolProperty(
@@ -241,6 +282,93 @@ class Render_Notifications_Properties(PropertyGroup):
         default = "C:/tmp/",
         maxlen = 1024
     )
+    preview_max_size: bpy.props.IntProperty(
+        name="Preview max size",
+        description="Longest side of the preview images sent to discord in pixels. Larger renders are downscaled. 0 keeps the rendered size.",
+        default=1920,
+        min=0,
+        subtype='PIXEL'
+    ) # type: ignore
+    preview_format: bpy.props.EnumProperty(
+        name="Preview format",
+        description="File format of the preview images sent to discord. JPEG and WebP need Pillow, which isn't shipped with blender or this add-on. PNG is used without it.",
+        items=[
+            ('PNG', "PNG", "Lossless, the image is downscaled further if it doesn't fit the size limit"),
+            ('JPEG', "JPEG", "Small files, quality is lowered automatically to fit the size limit. Needs Pillow"),
+            ('WEBP', "WebP", "Smallest files, quality is lowered automatically to fit the size limit. Needs Pillow"),
+        ],
+        default='PNG'
+    ) # type: ignore
+    preview_max_mb: bpy.props.FloatProperty(
+        name="Preview size limit",
+        description="Largest preview file in MB. Discord allows 10 MB per attachment without nitro.",
+        default=10.0,
+        min=0.1
+    ) # type: ignore
+    preview_capture: bpy.props.EnumProperty(
+        name="Preview source",
+        description="Where preview pixels are read from",
+        items=[
+            ('FILE', "Output File", "Read the frame blender wrote to disk, the Viewer Node or Render Result are used if it's missing. Files that can't be sent as they are (EXR, too large) are decoded on the main thread. Progress previews and contact sheet thumbnails of those frames need a Viewer node"),
+            ('VIEWER', "Viewer Node", "Copy the compositor's Viewer Node pixels directly (needs a Viewer node), skips writing and reading files"),
+        ],
+        default='FILE'
+    ) # type: ignore
+    progress_preview: bpy.props.BoolProperty(
+        name="Progress previews",
+        description="Replace the image on the discord message with the latest rendered frame every N frames or T minutes",
+        default=False
+    ) # type: ignore
+    progress_preview_frames: bpy.props.IntProperty(
+        name="Progress preview every N frames",
+        description="Send a progress preview every N rendered frames. 0 disables the frame interval",
+        default=25,
+        min=0
+    ) # type: ignore
+    progress_preview_minutes: bpy.props.FloatProperty(
+        name="Progress preview every T minutes",
+        description="Send a progress preview when T minutes passed since the last one. 0 disables the time interval",
+        default=15.0,
+        min=0.0
+    ) # type: ignore
+    progress_preview_budget_mb: bpy.props.FloatProperty(
+        name="Progress preview budget",
+        description="Most MB of progress previews uploaded per render job, no more progress previews are sent once it's used up",
+        default=50.0,
+        min=0.1
+    ) # type: ignore
+    contact_sheet: bpy.props.BoolProperty(
+        name="Contact sheet",
+        description="Collect a thumbnail of every Nth frame of an animation and send them as one image with the complete/cancel message",
+        default=False
+    ) # type: ignore
+    contact_sheet_every: bpy.props.IntProperty(
+        name="Contact sheet every N frames",
+        description="Add every Nth rendered frame to the contact sheet (at most 64 thumbnails)",
+        default=10,
+        min=1
+    ) # type: ignore
+    contact_sheet_animated: bpy.props.BoolProperty(
+        name="Animated contact sheet",
+        description="Send the thumbnails as a short animated WebP (GIF for PNG previews) instead of a grid. Needs Pillow",
+        default=False
+    ) # type: ignore
+    preview_tonemap: bpy.props.EnumProperty(
+        name="HDR preview tonemap",
+        description="Curve used to make previews of float outputs (EXR, multilayer EXR)",
+        items=[
+            ('STANDARD', "Standard", "Exposure and sRGB transform, highlights clip at 1.0"),
+            ('FILMIC', "Filmic", "Filmic like curve that rolls off highlights"),
+        ],
+        default='FILMIC'
+    ) # type: ignore
+    preview_exposure: bpy.props.FloatProperty(
+        name="HDR preview exposure",
+        description="Exposure in stops applied to float outputs before the tonemap",
+        default=0.0,
+        soft_min=-10.0,
+        soft_max=10.0
+    ) # type: ignore
     
     #Third-party webhook notifications
     third_party_webhook_every_frame: bpy.props.BoolProperty(
@@ -249,6 +377,30 @@ class Render_Notifications_Properties(PropertyGroup):
         default=False,  # Starts unchecked
         update=update_third_party_webhook_every_frame
     ) # type: ignore
+    third_party_webhook_batch: bpy.props.BoolProperty(
+        name="Batch every frame notifications",
+        description="Collect every frame notifications and send them together as one JSON array instead of one request per frame. Start, first frame, completion and cancel notifications are still sent right away.",
+        default=False  # Starts unchecked
+    ) # type: ignore
+    third_party_webhook_batch_frames: bpy.props.IntProperty(
+        name="Frames per batch",
+        description="Send the batch once this many frames have been collected.",
+        default=10,
+        min=2
+    ) # type: ignore
+    third_party_webhook_batch_seconds: bpy.props.FloatProperty(
+        name="Batch interval",
+        description="Send the batch after this many seconds even if it isn't full. 0 waits until the batch is full.",
+        default=30.0,
+        min=0.0,
+        subtype='TIME_ABSOLUTE',
+        unit='TIME_ABSOLUTE'
+    ) # type: ignore
+    third_party_webhook_batch_gzip: bpy.props.BoolProperty(
+        name="Gzip batches",
+        description="Compress batched notifications with gzip (sent with 'Content-Encoding: gzip'). The receiving server must support it.",
+        default=False  # Starts unchecked
+    ) # type: ignore
     third_party_webhook_start: bpy.props.BoolProperty(
         name="Third-party webhook notify on start",
         description="Send third-party webhook notifications when the render job starts.",
@@ -362,6 +514,15 @@ class RENDER_PT_Notifications(RenderNotificationsPanel, Panel):
         scene = context.scene
         props = scene.render_panel_props 
         layout.enabled = props.enable_notifications
+        eta_col = layout.column()
+        eta_col.prop(props, "eta_method", text="ETA Estimate")
+        eta_col.prop(props, "eta_warmup", text="Warm-up Frames")
+        eta_col.prop(props, "export_frame_times", text="Export Frame Times")
+        slow_row = eta_col.row()
+        slow_row.prop(props, "slow_frame_alert", text="Slow Frame Alerts")
+        factor_col = slow_row.column()
+        factor_col.enabled = props.slow_frame_alert
+        factor_col.prop(props, "slow_frame_factor", text="x Median")
 
 class RENDER_PT_Desktop_Notifications(RenderNotificationsPanel, Panel):
     bl_label = "Desktop Notifications"
@@ -421,6 +582,32 @@ class RENDER_PT_Discord_Notifications(RenderNotificationsPanel, Panel):
         discord_col.prop(props, "discord_preview", text="Send Previews")
         discord_col.prop(props, "use_custom_preview_path", text="Use Custom Preview Path")
         discord_col.prop(props, "discord_preview_path", text="Previews Save Location") 
+        preview_col = discord_col.column()
+        preview_col.enabled = props.discord_preview
+        preview_col.prop(props, "preview_max_size", text="Preview Max Size")
+        format_row = preview_col.row()
+        # JPEG and WebP can't be written without Pillow, previews are always PNG then
+        format_row.enabled = preview.HAS_PILLOW
+        format_row.prop(props, "preview_format", text="Preview Format")
+        if not preview.HAS_PILLOW:
+            preview_col.label(text="JPEG/WebP previews need Pillow, using PNG", icon='INFO')
+        preview_col.prop(props, "preview_max_mb", text="Preview Size Limit (MB)")
+        preview_col.prop(props, "preview_capture", text="Preview Source")
+        preview_col.prop(props, "preview_tonemap", text="HDR Tonemap")
+        preview_col.prop(props, "preview_exposure", text="HDR Exposure")
+        preview_col.prop(props, "progress_preview", text="Progress Previews")
+        progress_col = preview_col.column()
+        progress_col.enabled = props.progress_preview
+        progress_col.prop(props, "progress_preview_frames", text="Every N Frames")
+        progress_col.prop(props, "progress_preview_minutes", text="Every T Minutes")
+        progress_col.prop(props, "progress_preview_budget_mb", text="Budget per Job (MB)")
+        preview_col.prop(props, "contact_sheet", text="Contact Sheet")
+        sheet_col = preview_col.column()
+        sheet_col.enabled = props.contact_sheet
+        sheet_col.prop(props, "contact_sheet_every", text="Every N Frames")
+        animated_row = sheet_col.row()
+        animated_row.enabled = preview.HAS_PILLOW
+        animated_row.prop(props, "contact_sheet_animated", text="Animated")
 
 class RENDER_PT_Webhook_Notifications(RenderNotificationsPanel, Panel):
     bl_label = "Third Party Webhook Notifications"
@@ -448,6 +635,14 @@ class RENDER_PT_Webhook_Notifications(RenderNotificationsPanel, Panel):
         third_party_webhook_col = layout.column()
         third_party_webhook_col.label(text="Configure Third-party Notifications:")
         third_party_webhook_col.prop(props, "third_party_webhook_every_frame", text="Notify On Every Frame")
+        batch_col = third_party_webhook_col.column()
+        batch_col.enabled = props.third_party_webhook_every_frame
+        batch_col.prop(props, "third_party_webhook_batch", text="Batch Every Frame")
+        batch_sub = batch_col.column()
+        batch_sub.enabled = props.third_party_webhook_batch
+        batch_sub.prop(props, "third_party_webhook_batch_frames", text="Frames Per Batch")
+        batch_sub.prop(props, "third_party_webhook_batch_seconds", text="Batch Interval")
+        batch_sub.prop(props, "third_party_webhook_batch_gzip", text="Gzip Batches")
         third_party_webhook_col.prop(props, "third_party_webhook_start", text="Notify On Start")
         third_party_webhook_col.prop(props, "third_party_webhook_first", text="Notify On First")
         third_party_webhook_col.prop(props, "third_party_webhook_completion", text="Notify On Completion")
@@ -487,6 +682,19 @@ class RENDER_PT_Simplified_Webhook_Notifications(RenderNotificationsPanel, Panel
         third_party_webhook_col.prop(props, "on_cancel", text="Cancel")
 
 
+# Folder for the notification outboxes (notifications that still have to be delivered)
+def get_outbox_dir():
+    try:
+        return bpy.utils.extension_path_user(__package__, path="outbox", create=True)
+    except Exception:
+        # not installed as an extension
+        path = os.path.join(tempfile.gettempdir(), "render_notifications", "outbox")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+# Frames rendered before slow frame alerts start, the median isn't meaningful before that
+SLOW_FRAME_MIN_FRAMES = 5
+
 # RenderNotifier class to handle the rendering notifications logic
 class RenderNotifier:
     def __init__(self):
@@ -494,7 +702,10 @@ class RenderNotifier:
         self.blend_filename = None
         self.is_animation = False
         self.total_frames = 0
-        self.average_est_frames = []
+        self.frame_stats = FrameStats()
+        self.eta_engine = ETAEngine()
+        self.frame_timeline = FrameTimeline(1)
+        self.frame_sketch = QuantileSketch()
         self.RENDER_START_TIME = None
         self.RENDER_PRE_TIME = None
         self.RENDER_TOTAL_TIME = None
@@ -530,23 +741,45 @@ class RenderNotifier:
         self.tmp_output_name = ""
         self.tmp_output_name_frist = ""
         
-        self.is_less_than = False
-        self.is_skip_frame = False
-        self.skip_frame = 0
-        self.skip_frame_counter = 0
-        
         self.isfirst_frame = False
         
         self.is_response_received = False
         
         self.p = None
+        self.discord_writer = None
+        self.webhook_dispatcher = None
+        self.desktop_notifier = None
+        self.preview_worker = None
+        self.main_thread_calls = collections.deque()
+        self.main_thread_timer_running = False
+        self.readiness_watcher = None
+        self.ready_timer_running = False
+        self.preview_settings = preview.PreviewSettings()
+        self.preview_capture = 'FILE'
+        self.pixel_pool = preview.BufferPool()
+        self.contact_sheet = None
+        self.contact_sheet_animated = False
+        self.export_frame_times = False
+        self.slow_frame_alert = False
+        self.slow_frame_factor = 3.0
+        self.progress_preview = False
+        self.progress_preview_frames = 0
+        self.progress_preview_seconds = 0
+        self.progress_budget = 0
+        self.progress_bytes = 0
+        self.last_progress_counter = 0
+        self.last_progress_time = 0
+        self.job_id = None
     
     # reset variables on render initialization
     # this is called when the render job starts
     def clean_var(self):
         self.is_animation = False
         self.total_frames = 0
-        self.average_est_frames = []
+        self.frame_stats = FrameStats()
+        self.eta_engine = ETAEngine()
+        self.frame_timeline = FrameTimeline(1)
+        self.frame_sketch = QuantileSketch()
         self.RENDER_START_TIME = None
         self.RENDER_PRE_TIME = None
         self.RENDER_TOTAL_TIME = None
@@ -559,124 +792,492 @@ class RenderNotifier:
         self.current_frame = None
         self.counter = 0
         self.precountdown = 0.0
+        self.contact_sheet = None
+        self.progress_bytes = 0
+        self.last_progress_counter = 1
+        self.last_progress_time = time.time()
+        self.rendered_frame_path = None
+        if self.readiness_watcher:
+            # frames written by the last job must not count as ready
+            self.readiness_watcher.reset()
         
         self.tmp_output_name = ""
         self.tmp_output_name_frist = ""
 
-    # handle discord webhook using a separate thread-safe event loop
-    def send_webhook_non_blocking(self, init=False, frame=False,isfirstframe=False, finished=False, canceled=False,blender_data=None):
-        current_frame_time = getattr(self, 'current_frame_time', 0.0)
-        current_frame = self.current_frame
-        is_last_frame = current_frame == self.total_frames
-        # Dynamic frame skipping logic to avoid filling up STDIN buffer
-        if not init and not isfirstframe and not finished and not canceled and not is_last_frame:  
-            if current_frame_time <= 1.0: # if frame time is less than 1 second
-                self.is_less_than = True
-            else:
-                self.is_less_than = False
-            
-            # Adjust skip frame settings based on current frame time
-            if self.is_less_than and not self.is_skip_frame: # if frame time is less than 1 second and not already skipping frames
-                self.is_skip_frame = True
-                self.skip_frame = math.ceil(1.0 / current_frame_time) # calculate how many frames to skip (rounding up)
-                print(f"Will skip {self.skip_frame} frames to avoid filling up STDIN buffer. frame time: {current_frame_time}")
-            elif self.is_less_than and self.is_skip_frame:
-                print(f"Skipping frame {current_frame} to avoid filling up STDIN buffer. frame time: {current_frame_time}")
-                #return
-            else:
-                self.is_skip_frame = False
-                self.skip_frame = 0
-                self.skip_frame_counter = 0
-                print("Not skipping frames anymore. frame time:", current_frame_time)
-            
-            # Skip frame logic
-            if self.skip_frame_counter < self.skip_frame:
-                self.skip_frame_counter += 1
-                print(f"Skipping frame {current_frame} ({self.skip_frame_counter}/{self.skip_frame})")
-                return
-            elif self.skip_frame_counter == self.skip_frame and self.is_skip_frame:
-                print(f"stop skipping frames: frame {current_frame} ({self.skip_frame_counter}/{self.skip_frame})")
-                self.skip_frame_counter = 0
-                self.is_skip_frame = False
-                #return
-                # proceed to send data
-            #elif self.skip_frame_counter > self.skip_frame:
-            #    #self.skip_frame_counter = 0
-            #    print("Not skipping frames anymore")
-            
+    # Start the discord worker process once per blender session and reuse it for every render job
+    def start_discord_worker(self):
+        if self.p and self.p.poll() is None and self.discord_writer and self.discord_writer.is_alive():
+            return self.p
+        self.stop_discord_worker()
+        
+        print("Starting discord worker process...")
+        # Use sys.executable and the addon path to ensure we run the project's discord_process.py
+        addon_dir = os.path.dirname(__file__)
+        discord_process = os.path.join(addon_dir, "discord_process.py")
+        
+        # Parent process environment variables
+        parent_env = os.environ.copy()
+        # Add the parent's sys.path to the PYTHONPATH environment variable
+        parent_env['PYTHONPATH'] = os.pathsep.join(sys.path)
+        
+        # Use -u for unbuffered output so we can stream. stdin carries binary ipc_protocol frames
+        self.p = subprocess.Popen(
+            [sys.executable, "-u", discord_process, os.path.join(get_outbox_dir(), "discord.jsonl")],
+            env=parent_env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # the worker's prints (errors, rate limit stats, acks) and tracebacks share one pipe
+            stderr=subprocess.STDOUT
+        )
+        # the worker lives for the whole session, so its output has to be drained or the pipe fills up
+        threading.Thread(target=self._drain_worker_output, args=(self.p,), daemon=True).start()
+        # messages are written to the worker's stdin on a background thread.
+        # the worker runs on the same interpreter, so the compact marshal encoding can be used
+        self.discord_writer = PipeWriter(self.p, encoding=ipc_protocol.ENCODING_MARSHAL)
+        self.discord_writer.start()
+        return self.p
+    
+    def _drain_worker_output(self, p):
         try:
-            if blender_data is None:
-                blender_data = self.blender_data
-
-            start_timer = time.time()
-            print("Sending data to subprocess:", blender_data)
+            for line in p.stdout:
+                print("Discord worker:", line.decode(errors="replace").rstrip())
+        except Exception as e:
+            print(f"Error reading discord worker output: {e}")
+    
+    # Ask the discord worker to exit (called when the addon is unregistered)
+    def stop_discord_worker(self):
+        p, self.p = self.p, None
+        writer, self.discord_writer = self.discord_writer, None
+        if writer:
+            writer.stop()
+        if not p or p.poll() is not None:
+            return
+        try:
+            if writer:
+                writer.join(timeout=2)
+            p.wait(timeout=2)
+            print("Discord worker finished. returncode=", p.returncode)
+        except Exception as e:
+            print(f"Error stopping discord worker: {e}")
+            p.kill()
+    
+    # Start the third-party webhook dispatcher thread once per blender session
+    def start_webhook_dispatcher(self):
+        if self.webhook_dispatcher and self.webhook_dispatcher.is_alive():
+            return self.webhook_dispatcher
+        try:
+            outbox = Outbox(os.path.join(get_outbox_dir(), "webhooks.jsonl"))
+        except OSError as e:
+            print(f"⚠️ Could not open the webhook outbox, failed webhooks won't be retried: {e}")
+            outbox = None
+        self.webhook_dispatcher = WebhookDispatcher(outbox=outbox)
+        self.webhook_dispatcher.start()
+        return self.webhook_dispatcher
+    
+    def stop_webhook_dispatcher(self):
+        dispatcher, self.webhook_dispatcher = self.webhook_dispatcher, None
+        if dispatcher:
+            dispatcher.stop()
+    
+    # Start the desktop notification thread once per blender session
+    def start_desktop_notifier(self):
+        if self.desktop_notifier and self.desktop_notifier.is_alive():
+            return self.desktop_notifier
+        addon_dir = os.path.dirname(__file__)
+        icon_path = os.path.join(addon_dir, "resources", "images", "blender_logo.png")
+        self.desktop_notifier = DesktopNotifier(icon_path)
+        self.desktop_notifier.start()
+        return self.desktop_notifier
+    
+    def stop_desktop_notifier(self):
+        notifier, self.desktop_notifier = self.desktop_notifier, None
+        if notifier:
+            notifier.stop()
+    
+    # Start the preview encoding thread once per blender session
+    def start_preview_worker(self):
+        if not self.main_thread_timer_running:
+            self.main_thread_timer_running = True
+            # persistent, the worker outlives loading another blend file
+            bpy.app.timers.register(self.run_main_thread_calls, first_interval=0.1, persistent=True)
+        if self.preview_worker and self.preview_worker.is_alive():
+            return self.preview_worker
+        self.preview_worker = PreviewWorker()
+        self.preview_worker.start()
+        return self.preview_worker
+    
+    # Called on the preview worker: run func on blender's main thread, the only thread that may change blender_data
+    def call_on_main_thread(self, func, *args):
+        self.main_thread_calls.append((func, args))
+    
+    # bpy timer: runs the calls the preview worker handed back, for as long as the worker is running
+    def run_main_thread_calls(self):
+        while self.main_thread_calls:
+            func, args = self.main_thread_calls.popleft()
             try:
-                s = json.dumps(blender_data) + "\n"
-                # Ensure subprocess exists and stdin is writable before writing
-                if not self.p:
-                    print("⚠️ Subprocess handle is None. Skipping write.")
-                elif self.p.poll() is not None:
-                    print(f"⚠️ Subprocess has exited (returncode={self.p.returncode}). Skipping write.")
-                elif not hasattr(self.p, "stdin") or self.p.stdin is None or self.p.stdin.closed:
-                    print("⚠️ Subprocess stdin is closed or unavailable. Skipping write.")
-                else:
-                    try:
-                        self.p.stdin.write(s)
-                        self.p.stdin.flush()
-                        print("Written to subprocess stdin:")
-                        print("Flushed subprocess stdin.")
-                    except BrokenPipeError as e:
-                        print(f"BrokenPipeError writing to subprocess: {e} (errno={getattr(e,'errno',None)})")
-                        try:
-                            err = self.p.stderr.read()
-                            if err:
-                                print("Subprocess stderr:", err.strip())
-                        except Exception as re:
-                            print(f"Error reading subprocess stderr after BrokenPipeError: {re}")
-                    except OSError as e:
-                        print(f"OSError writing to subprocess: {e} (errno={getattr(e,'errno',None)})")
-                        try:
-                            err = self.p.stderr.read()
-                            if err:
-                                print("Subprocess stderr:", err.strip())
-                        except Exception as re:
-                            print(f"Error reading subprocess stderr after OSError: {re}")
-                    except Exception as e:
-                        print(f"Unexpected error writing to subprocess: {type(e).__name__}: {e}")
-
+                func(*args)
             except Exception as e:
-                print(f"⚠️ Error occurred while preparing data to write to subprocess: {e}")
-
-            #print("Data sent to subprocess, waiting for response...")
-            # Read response
-            #out_line = self.p.stdout.readline()
-            #print("Response received from subprocess:", out_line)
-            #print("\n\n")
-            ## Check for EOF
-            #if not out_line:
-            #    print("No response (EOF).")
-            ## process the response
-            #try:
-            #    parsed = json.loads(out_line.strip())
-            #    #self.is_response_received = True
-            #    print("Response:", parsed)
-            #except Exception:
-            #    print("Error parsing JSON response: (raw)", out_line.strip())
-
+                print(f"⚠️ Error handling a preview result: {type(e).__name__}: {e}")
+        if self.preview_worker and self.preview_worker.is_alive():
+            return 0.1
+        self.main_thread_timer_running = False
+        return None
+    
+    def stop_preview_worker(self):
+        worker, self.preview_worker = self.preview_worker, None
+        if worker:
+            worker.stop()
+    
+    # Start the thread that waits for rendered frames to be written
+    def start_readiness_watcher(self):
+        if self.readiness_watcher and self.readiness_watcher.is_alive():
+            return self.readiness_watcher
+        self.readiness_watcher = ReadinessWatcher()
+        self.readiness_watcher.start()
+        return self.readiness_watcher
+    
+    def stop_readiness_watcher(self):
+        watcher, self.readiness_watcher = self.readiness_watcher, None
+        if watcher:
+            watcher.stop()
+    
+    # Call callback on the main thread once blender has finished writing path (None if no file is written).
+    # If the file isn't ready before the timeout the preview falls back to the Viewer Node / Render Result.
+    def wait_for_output(self, path, callback, timeout=10.0):
+        def ready(status):
+            self.rendered_frame_path = path if status != "timeout" else None
+            callback()
+        self.start_readiness_watcher().watch(path, ready, timeout)
+        if not self.ready_timer_running:
+            self.ready_timer_running = True
+            bpy.app.timers.register(self.run_ready_callbacks, first_interval=0.01)
+    
+    # bpy timer: runs the callbacks of ready files, stops itself when nothing is being waited on
+    def run_ready_callbacks(self):
+        watcher = self.readiness_watcher
+        if watcher:
+            watcher.run_ready()
+            if watcher.pending:
+                return 0.02
+        self.ready_timer_running = False
+        return None
+    
+    # Read an image file into a numpy array. Blender decodes the file, so this must run on the main thread.
+    # Returns (pixels, linear), float images (EXR, multilayer EXR) hold linear values that still need a tonemap.
+    # For multilayer EXR blender exposes the first layer's combined pass.
+    def read_image_pixels(self, path):
+        image = bpy.data.images.load(path, check_existing=False)
+        try:
+            width, height = image.size
+            if not width or not height or not len(image.pixels):
+                raise RuntimeError(f"no pixels could be read from {path}")
+            pixels = self.pixel_pool.acquire(width * height * image.channels)
+            image.pixels.foreach_get(pixels)
+            return pixels.reshape(height, width, image.channels), image.is_float
+        finally:
+            bpy.data.images.remove(image)
+    
+    # Copy the compositor's Viewer Node straight into a pooled buffer, no file is written or decoded.
+    # Blender doesn't expose the Render Result's pixels to python, so this needs a Viewer node in the compositor.
+    # Returns None when the viewer image isn't from this render.
+    def capture_viewer_pixels(self):
+        scene = bpy.context.scene
+        image = bpy.data.images.get('Viewer Node')
+        tree = getattr(scene, "node_tree", None) or getattr(scene, "compositing_node_group", None)
+        if not image or not scene.render.use_compositing or not tree:
+            return None
+        if not any(node.type == 'VIEWER' and not node.mute for node in tree.nodes):
+            return None
+        scale = scene.render.resolution_percentage / 100
+        width, height = image.size
+        if (width, height) != (int(scene.render.resolution_x * scale), int(scene.render.resolution_y * scale)):
+            return None
+        pixels = self.pixel_pool.acquire(width * height * image.channels)
+        image.pixels.foreach_get(pixels)
+        return pixels.reshape(height, width, image.channels), True
+    
+    # Save the Render Result to a temporary file, used when blender didn't write the frame to disk.
+    # With a movie output blender saves a single PNG frame instead of the movie format.
+    def save_render_result(self):
+        image = bpy.data.images.get('Render Result')
+        if not image or not image.has_data:
+            raise RuntimeError("Render Result not available")
+        name = "render_result.png" if bpy.context.scene.render.is_movie_format else "render_result"
+        path = os.path.join(tempfile.gettempdir(), "render_notifications", name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        image.save_render(path)
+        return path
+    
+    # Queue a preview of the frame blender wrote to disk (or the Render Result if no file was written).
+    # Only reading the pixels happens here, downscaling, encoding and sending run on the preview worker.
+    # Returns False if no preview could be made.
+    def save_preview(self, path_key, send):
+        data = dict(self.blender_data)
+        src = getattr(self, 'rendered_frame_path', None)
+        print(f"Rendered frame path: {src}")
+        if src and preview.is_movie_file(src):
+            print("🎞️ Movie output, the preview is taken from the Viewer Node or Render Result")
+            src = None
+        # small enough png/jpg/webp frames are linked or referenced as they are, nothing is decoded or copied
+        if self.preview_capture != 'VIEWER' and src and os.path.isfile(src) and preview.can_pass_through(src, self.preview_settings):
+            self.start_preview_worker().submit(self.link_preview_task, src, path_key, data, send)
+            return True
+        captured = self.capture_preview_pixels(src)
+        if captured is None:
+            return False
+        pixels, linear = captured
+        self.start_preview_worker().submit(self.encode_preview_task, pixels, linear, path_key, data, send)
+        return True
+    
+    # Read the pixels of the current frame, cheapest source first.
+    # Loading the rendered file decodes the whole image (PNG, EXR) on the main thread, and saving the Render Result
+    # encodes and decodes it, so the Render Result is the last resort.
+    # With decode=False only the Viewer Node is copied, for captures made while the animation is still rendering.
+    # Returns (pixels, linear) or None.
+    def capture_preview_pixels(self, src, decode=True):
+        readers = []
+        if self.preview_capture == 'VIEWER' or not decode:
+            readers.append(("Viewer Node", self.capture_viewer_pixels))
+        if decode and src and os.path.isfile(src):
+            readers.append(("rendered frame", lambda: self.read_image_pixels(src)))
+        if decode and self.preview_capture != 'VIEWER':
+            readers.append(("Viewer Node", self.capture_viewer_pixels))
+        if decode:
+            readers.append(("Render Result", lambda: self.read_image_pixels(self.save_render_result())))
+        
+        for name, reader in readers:
+            start = time.perf_counter()
+            try:
+                captured = reader()
+            except Exception as e:
+                print(f"⚠️ Failed to read the {name}: {e}")
+                continue
+            if captured is not None:
+                print(f"📸 Preview captured from the {name} in {(time.perf_counter() - start) * 1000:.1f} ms")
+                break
+        else:
+            if decode:
+                print("❌ Failed to read preview image")
+            return None
+        return captured
+    
+    # Runs on the preview worker: hardlink/reflink the rendered frame into the preview folder (or reference it) and send the message
+    def link_preview_task(self, src, path_key, data, send):
+        no_preview_key = 'no_first_preview' if path_key == 'final_first_path' else 'no_preview'
+        try:
+            dst = os.path.splitext(data[path_key])[0] + os.path.splitext(src)[1].lower()
+            data[path_key], method = preview.link_preview(src, dst)
+            print(f"🔗 Preview {method}: {data[path_key]} (saved copying {os.path.getsize(src) / (1024 * 1024):.2f} MB)")
+            self.call_on_main_thread(self.update_preview_path, path_key, data[path_key], data.get("job_id"))
+        except Exception as e:
+            print(f"❌ Failed to link preview: {e}")
+            data[no_preview_key] = True
+        send(data)
+    
+    # Queue a preview of the frame that was just written if N frames or T minutes passed since the last one
+    # and the job's upload budget isn't used up. Called when a frame is written.
+    def queue_progress_preview(self):
+        if self.counter <= 1 or self.progress_bytes >= self.progress_budget:
+            return
+        frames_due = self.progress_preview_frames and self.counter - self.last_progress_counter >= self.progress_preview_frames
+        time_due = self.progress_preview_seconds and time.time() - self.last_progress_time >= self.progress_preview_seconds
+        if not (frames_due or time_due):
+            return
+        if self.preview_worker and self.preview_worker.depth:
+            # still busy with earlier previews, try again on the next frame
+            return
+        src = self.rendered_frame_path
+        settings = copy.copy(self.preview_settings)
+        settings.max_bytes = min(settings.max_bytes, self.progress_budget - self.progress_bytes)
+        if self.preview_capture != 'VIEWER' and src and os.path.isfile(src) and preview.can_pass_through(src, settings):
+            # the written frame is sent as it is, nothing is decoded
+            self.mark_progress_preview()
+            self.start_preview_worker().submit(self.progress_link_task, src, dict(self.blender_data))
+            return
+        # decoding a file on every Nth frame would hold up the render, only the Viewer Node is copied here
+        captured = self.capture_preview_pixels(src, decode=False)
+        if captured is None:
+            return
+        self.mark_progress_preview()
+        pixels, linear = captured
+        self.start_preview_worker().submit(self.progress_preview_task, pixels, linear, dict(self.blender_data))
+    
+    def mark_progress_preview(self):
+        self.last_progress_counter = self.counter
+        self.last_progress_time = time.time()
+    
+    # Runs on the preview worker: link the written frame as the progress preview and update the message
+    def progress_link_task(self, src, data):
+        try:
+            dst = os.path.join(self.tmp_output_path, self.tmp_output_name + " progress" + os.path.splitext(src)[1].lower())
+            data['progress_path'], method = preview.link_preview(src, dst)
+            size = os.path.getsize(src)
+        except Exception as e:
+            print(f"⚠️ Skipped progress preview: {e}")
+            return
+        self.progress_preview_saved(data, size)
+    
+    # Runs on the preview worker: encode the progress preview within what's left of the budget and update the message
+    def progress_preview_task(self, pixels, linear, data):
+        try:
+            settings = copy.copy(self.preview_settings)
+            settings.max_bytes = min(settings.max_bytes, self.progress_budget - self.progress_bytes)
+            encoded, extension = preview.encode_preview(pixels, settings, linear)
+            data['progress_path'] = os.path.join(self.tmp_output_path, self.tmp_output_name + " progress" + extension)
+            preview.write_preview(data['progress_path'], encoded)
+        except Exception as e:
+            print(f"⚠️ Skipped progress preview: {e}")
+            return
+        finally:
+            self.pixel_pool.release(pixels)
+        self.progress_preview_saved(data, len(encoded))
+    
+    # Runs on the preview worker once a progress preview was written
+    def progress_preview_saved(self, data, size):
+        self.progress_bytes += size
+        print(f"✅ Progress preview of frame {data.get('frame')} saved ({size} bytes, {self.progress_bytes}/{self.progress_budget} bytes of the job's budget used)")
+        self.call_on_main_thread(self.show_progress_preview, data['progress_path'], data.get("job_id"))
+    
+    # Runs on the main thread: put the progress preview on the job's message
+    def show_progress_preview(self, path, job_id):
+        if not self.update_preview_path('progress_path', path, job_id):
+            return
+        # resend the job's latest state so the new preview shows up without waiting for the next frame
+        if self.blender_data.get("call_type") == "render_post":
+            self.send_webhook_non_blocking(frame=True)
+    
+    # Feed a finished frame's render time to the job's stats, ETA engine, timeline and percentile sketch.
+    # Returns the running median if the frame was slower than slow_frame_factor times the median, None otherwise.
+    def record_frame_time(self, frame, seconds):
+        now = time.time()
+        self.frame_stats.add(seconds)
+        self.eta_engine.add(seconds)
+        self.frame_timeline.add(frame, now - seconds, now)
+        # the median is taken before the frame is added, and only once there are enough frames to trust it
+        median = self.frame_sketch.quantile(0.5) if self.frame_sketch.count >= SLOW_FRAME_MIN_FRAMES else None
+        self.frame_sketch.add(seconds)
+        if self.slow_frame_alert and median and seconds > median * self.slow_frame_factor:
+            return median
+        return None
+    
+    # Tell every enabled notifier about a frame that took much longer than the median
+    def notify_slow_frame(self, frame, seconds, median):
+        alert = {
+            "frame": frame,
+            "time": format_duration(seconds),
+            "median": format_duration(median),
+            "factor": round(seconds / median, 1),
+        }
+        self.blender_data["slow_frame"] = alert
+        print(f"🐢 Slow frame {frame}: {alert['time']}, {alert['factor']}x the median frame time ({alert['median']})")
+        # discord gets the alert with this frame's message
+        if self.is_desktop:
+            self.notify_desktop(
+                title="Slow frame",
+                message=f"Frame {frame} of {self.blender_data.get('project_name')} took {alert['time']} \n{alert['factor']}x the median frame time ({alert['median']})"
+                )
+        if self.is_third_party_webhook:
+            self.send_third_party_webhook(stage=5)
+    
+    # Write the job's per-frame timings (CSV and JSON) next to the previews, on the preview worker thread
+    def export_frame_timeline(self):
+        timeline = self.frame_timeline
+        if not self.export_frame_times or not len(timeline):
+            return
+        base_path = os.path.join(self.tmp_output_path, self.tmp_output_name + " frame times")
+        info = {"project": self.blend_filename, "job_type": self.job_type, "frame_step": self.frame_step}
+        def export():
             try:
-                if finished or canceled:
-                    # Send exit command
-                    self.p.stdin.close()
-                    ret = self.p.wait(timeout=0.1)
-                    err = self.p.stderr.read()
-                    print("Process finished. returncode=", ret)
-                    if err:
-                        print("Stderr:", err.strip())
+                os.makedirs(self.tmp_output_path, exist_ok=True)
+                timeline.write_csv(base_path + ".csv")
+                timeline.write_json(base_path + ".json", **info)
+                print(f"✅ Frame times of {len(timeline)} frames exported to: {base_path}.csv/.json")
             except Exception as e:
-                print(f"Error closing subprocess: {e}")
-            print(f"✅ Successfully ran writing subprocess in {time.time() - start_timer} seconds")
+                print(f"❌ Failed to export frame times: {e}")
+        self.start_preview_worker().submit(export)
+    
+    # Add the current frame to the contact sheet if it's one of every Nth frames. Called when a frame is written.
+    def add_contact_sheet_frame(self, scene, src):
+        index = (scene.frame_current - scene.frame_start) // max(1, scene.frame_step)
+        if not self.contact_sheet.wants(index):
+            return
+        if self.preview_worker and self.preview_worker.depth:
+            # every queued frame holds a full resolution buffer, leave this one out rather than piling them up
+            print(f"⚠️ Preview worker is busy, frame {scene.frame_current} is left out of the contact sheet")
+            return
+        # thumbnails need pixels, decoding the written file on every Nth frame would hold up the render
+        captured = self.capture_preview_pixels(src, decode=False)
+        if captured is None:
+            return
+        pixels, linear = captured
+        self.start_preview_worker().submit(self.contact_sheet_task, self.contact_sheet, scene.frame_current, pixels, linear)
+    
+    # Runs on the preview worker
+    def contact_sheet_task(self, sheet, frame, pixels, linear):
+        try:
+            sheet.add(frame, pixels, self.preview_settings, linear)
+        finally:
+            self.pixel_pool.release(pixels)
+    
+    # Runs on the preview worker before the complete/cancel message is sent: encode the contact sheet and add it to data
+    def attach_contact_sheet(self, data):
+        sheet, self.contact_sheet = self.contact_sheet, None
+        if not sheet or len(sheet.frames) < 2:
+            return data
+        try:
+            encoded, extension = sheet.encode(self.preview_settings, self.contact_sheet_animated)
+            path = os.path.join(self.tmp_output_path, self.tmp_output_name + " contact sheet" + extension)
+            preview.write_preview(path, encoded)
+            data["contact_sheet_path"] = path
+            print(f"✅ Contact sheet saved to: {path} ({len(sheet.frames)} frames, {len(encoded)} bytes)")
+        except Exception as e:
+            print(f"❌ Failed to save contact sheet: {e}")
+        return data
+    
+    # Later messages of the job must point at the file that was actually written.
+    # Runs on the main thread (see call_on_main_thread), returns False if the job has already been replaced.
+    def update_preview_path(self, path_key, path, job_id):
+        if self.blender_data.get("job_id") != job_id:
+            return False
+        self.blender_data[path_key] = path
+        return True
+    
+    # Runs on the preview worker: tonemap HDR frames, fit the preview in discord's size limit, write it and send the message
+    def encode_preview_task(self, pixels, linear, path_key, data, send):
+        no_preview_key = 'no_first_preview' if path_key == 'final_first_path' else 'no_preview'
+        try:
+            encoded, extension = preview.encode_preview(pixels, self.preview_settings, linear)
+            data[path_key] = os.path.splitext(data[path_key])[0] + extension
+            preview.write_preview(data[path_key], encoded)
+            print(f"✅ Preview saved to: {data[path_key]} ({pixels.shape[1]}x{pixels.shape[0]} -> {len(encoded)} bytes)")
+            self.call_on_main_thread(self.update_preview_path, path_key, data[path_key], data.get("job_id"))
         except Exception as e:
-            print(f"⚠️ Error occurred while running writing subprocess: {e}")
+            print(f"❌ Failed to save preview: {e}")
+            data[no_preview_key] = True
+        finally:
+            self.pixel_pool.release(pixels)
+        send(data)
+    
+    # Queue data for the discord worker. The actual pipe write happens on the PipeWriter thread,
+    # so this returns immediately even if the worker is busy and its stdin pipe is full.
+    def send_webhook_non_blocking(self, init=False, frame=False,isfirstframe=False, finished=False, canceled=False,blender_data=None,slow_frame=False):
+        if blender_data is None:
+            blender_data = self.blender_data
+        
+        if not self.discord_writer:
+            print("⚠️ Discord worker is not running. Skipping message.")
+            return
+        
+        # plain progress updates may be dropped when the queue is full, everything else must arrive
+        is_last_frame = self.current_frame == self.total_frames
+        droppable = not (init or isfirstframe or finished or canceled or is_last_frame or slow_frame)
+        
+        # queue a snapshot, blender_data keeps changing while the message waits in the queue
+        if not self.discord_writer.send(dict(blender_data), droppable=droppable):
+            print(f"⚠️ Discord message queue is full, dropped update for frame {self.current_frame}.")
+        
+        if finished or canceled:
+            print(f"Discord messages queued: {self.discord_writer.depth}, dropped this session: {self.discord_writer.dropped}, bytes written this session: {self.discord_writer.bytes_written}")
 
     # Handle render logic
     @persistent
@@ -715,6 +1316,9 @@ class RenderNotifier:
         self.desktop_first = bpy.context.scene.render_panel_props.desktop_first
         self.desktop_completion = bpy.context.scene.render_panel_props.desktop_completion
         self.desktop_cancel = bpy.context.scene.render_panel_props.desktop_cancel
+        if self.is_desktop:
+            # the sound file is checked once per job instead of on every notification
+            self.start_desktop_notifier().set_sound(self.desktop_sound_path if self.is_custom_sound else None)
         
         ## Discord ##
         # Check if the user wants to use a custom preview path
@@ -734,37 +1338,57 @@ class RenderNotifier:
         self.discord_webhook_url = bpy.context.preferences.addons[addon_name].preferences.discord_webhook_url
         self.is_discord = bpy.context.scene.render_panel_props.is_discord
         self.discord_preview = bpy.context.scene.render_panel_props.discord_preview
+        self.preview_settings = preview.PreviewSettings(
+            max_size=bpy.context.scene.render_panel_props.preview_max_size,
+            file_format=bpy.context.scene.render_panel_props.preview_format,
+            max_bytes=int(bpy.context.scene.render_panel_props.preview_max_mb * 1024 * 1024),
+            tonemap=bpy.context.scene.render_panel_props.preview_tonemap,
+            exposure=bpy.context.scene.render_panel_props.preview_exposure
+        )
+        self.file_extension = self.preview_settings.extension
+        self.preview_capture = bpy.context.scene.render_panel_props.preview_capture
+        self.eta_engine = ETAEngine(
+            bpy.context.scene.render_panel_props.eta_method,
+            bpy.context.scene.render_panel_props.eta_warmup
+        )
+        self.frame_timeline = FrameTimeline(min(math.ceil(self.total_frames / self.frame_step), MAX_TIMELINE_FRAMES))
+        self.export_frame_times = bpy.context.scene.render_panel_props.export_frame_times
+        self.slow_frame_alert = bpy.context.scene.render_panel_props.slow_frame_alert
+        self.slow_frame_factor = bpy.context.scene.render_panel_props.slow_frame_factor
+        self.contact_sheet_animated = preview.HAS_PILLOW and bpy.context.scene.render_panel_props.contact_sheet_animated
+        self.progress_preview = self.is_discord and self.discord_preview and bpy.context.scene.render_panel_props.progress_preview
+        self.progress_preview_frames = bpy.context.scene.render_panel_props.progress_preview_frames
+        self.progress_preview_seconds = bpy.context.scene.render_panel_props.progress_preview_minutes * 60
+        self.progress_budget = int(bpy.context.scene.render_panel_props.progress_preview_budget_mb * 1024 * 1024)
+        if self.is_discord and self.discord_preview and bpy.context.scene.render_panel_props.contact_sheet:
+            self.contact_sheet = preview.ContactSheet(
+                math.ceil(self.total_frames / self.frame_step),
+                every=bpy.context.scene.render_panel_props.contact_sheet_every
+            )
         
         if self.is_discord:
-            print("Starting process...")
+            # every message sent to the discord worker is tagged with the job id
+            self.blender_data["job_id"] = self.job_id = uuid.uuid4().hex
             self.blender_data["discord_webhook_url"] = self.discord_webhook_url
             self.blender_data["discord_webhook_name"] = self.discord_webhook_name
             self.blender_data["discord_preview"] = self.discord_preview
             self.blender_data["first_rendered_frame_path"] = self.first_rendered_frame_path
-            # Use sys.executable and the addon path to ensure we run the project's sub.py
-            addon_dir = os.path.dirname(__file__)
-            discord_process = os.path.join(addon_dir, "discord_process.py")
-            
-            # Parent process environment variables
-            parent_env = os.environ.copy()
-            # Add the parent's sys.path to the PYTHONPATH environment variable
-            parent_env['PYTHONPATH'] = os.pathsep.join(sys.path)
-            
-            # Use -u for unbuffered output so we can stream
-            self.p = subprocess.Popen(
-                [sys.executable, "-u", discord_process],
-                env=parent_env,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
+            self.start_discord_worker()
         
         ## Webhook ##
         self.third_party_webhook_url = bpy.context.preferences.addons[addon_name].preferences.third_party_webhook_url
         self.is_third_party_webhook = bpy.context.scene.render_panel_props.is_third_party_webhook
         self.third_party_webhook_every_frame = bpy.context.scene.render_panel_props.third_party_webhook_every_frame
+        if self.is_third_party_webhook:
+            self.start_webhook_dispatcher()
+            if self.third_party_webhook_every_frame and bpy.context.scene.render_panel_props.third_party_webhook_batch:
+                self.webhook_dispatcher.set_batching(
+                    bpy.context.scene.render_panel_props.third_party_webhook_batch_frames,
+                    bpy.context.scene.render_panel_props.third_party_webhook_batch_seconds,
+                    bpy.context.scene.render_panel_props.third_party_webhook_batch_gzip
+                )
+            else:
+                self.webhook_dispatcher.set_batching()
         self.third_party_webhook_start = bpy.context.scene.render_panel_props.third_party_webhook_start
         self.third_party_webhook_first = bpy.context.scene.render_panel_props.third_party_webhook_first
         self.third_party_webhook_completion = bpy.context.scene.render_panel_props.third_party_webhook_completion
@@ -854,6 +1478,8 @@ class RenderNotifier:
         
         # Track call type for logging or webhook purposes
         self.blender_data["call_type"] = "render_post"
+        # a slow frame alert is only sent with the message of that frame
+        self.blender_data.pop("slow_frame", None)
         self.current_frame = scene.frame_current
         current_frame = scene.frame_current
         is_first_frame = self.current_frame == scene.frame_start
@@ -873,18 +1499,19 @@ class RenderNotifier:
                     # Estimate average time per frame and total job duration
                     self.precountdown = time.time() - self.render_start_countdown
                     self.current_frame_time = self.precountdown
-                    self.countdown = int(time.time() + self.precountdown * (stepped_frames - self.counter))
                     self.current_countdown = int(time.time() + self.precountdown)
                     self.precountdown = time.time()
                     
-                    self.average_est_frames.append(self.RENDER_FIRST_FRAME)
+                    self.record_frame_time(current_frame, self.RENDER_FIRST_FRAME.total_seconds())
                     self.RENDER_PRE_TIME = datetime.now()
                     self.counter += 1
+                    eta = self.eta_engine.estimate(stepped_frames - self.counter)
+                    self.countdown = int(time.time() + eta[0])
                     
                     # Populate render info for sending to Discord or display
                     self.blender_data["frame"] = current_frame
                     self.blender_data["RENDER_FIRST_FRAME"] = str(self.RENDER_FIRST_FRAME)[:-4]
-                    self.blender_data["est_render_job"] = str(self.RENDER_FIRST_FRAME * (stepped_frames - self.counter))[:-4]
+                    self.blender_data.update(self.eta_engine.fields(stepped_frames - self.counter))
                     self.blender_data["frames_left"] = f"{stepped_frames - self.counter}"
                     self.blender_data["frames_rendered"] = self.counter
                     self.blender_data["rendered_frames_percentage"] = round((self.counter / stepped_frames * 100),2)
@@ -897,38 +1524,18 @@ class RenderNotifier:
                     
                         
                         def delayed_first_frame_save():
-                            # Prefer copying the file that Blender wrote to disk (most reliable).
                             self.blender_data["frame"] = current_frame
                             self.blender_data["isfirst_frame"] = True
-                            try:
-                                src = getattr(self, 'rendered_frame_path', None)
-                                print(f"Rendered frame path: {src}")
-                                if src and os.path.isfile(src):
-                                    os.makedirs(os.path.dirname(self.final_first_path), exist_ok=True)
-                                    shutil.copy2(src, self.final_first_path)
-                                    print(f"✅ First frame copied from: {src} -> {self.final_first_path}")
-                                    self.send_webhook_non_blocking(frame=True,isfirstframe=True,blender_data=self.blender_data)
-                                    return None
-                            except Exception as e:
-                                print(f"⚠️ Failed to copy first frame: {e}")
-                            
-                            image = bpy.data.images.get('Render Result')
-                            if image and image.has_data:
-                                try:
-                                    os.makedirs(os.path.dirname(self.final_first_path), exist_ok=True)
-                                    image.save_render(self.final_first_path)
-                                    print(f"✅ First frame saved to: {self.final_first_path}")
-                                    self.send_webhook_non_blocking(frame=True,isfirstframe=True,blender_data=self.blender_data)
-                                except Exception as e:
-                                    print(f"❌ Failed to save first frame (render_post): {e}")
-                                    self.blender_data['no_first_preview'] = self.no_first_preview = True
-                                    print(f"⚠️ First frame preview not available. ({self.blender_data['no_first_preview']})")
-                                    self.send_webhook_non_blocking(frame=True,isfirstframe=True,blender_data=self.blender_data)
-                            else:
-                                print("⚠️ Render Result not available for first frame. (render_post)")
+                            send = lambda data: self.send_webhook_non_blocking(frame=True,isfirstframe=True,blender_data=data)
+                            if not self.save_preview('final_first_path', send):
+                                self.blender_data['no_first_preview'] = self.no_first_preview = True
+                                print(f"⚠️ First frame preview not available. ({self.blender_data['no_first_preview']})")
+                                send(self.blender_data)
                             return None
 
-                        bpy.app.timers.register(delayed_first_frame_save, first_interval=0.2)   
+                        # blender writes the frame after render_post, the watcher waits for render_write or a stable file
+                        expected_path = None if scene.render.is_movie_format else bpy.path.abspath(scene.render.frame_path(frame=scene.frame_current))
+                        self.wait_for_output(expected_path, delayed_first_frame_save)
                     elif self.is_discord and not self.discord_preview:
                         try:
                             self.send_webhook_non_blocking(frame=True,isfirstframe=True,blender_data=self.blender_data)
@@ -940,19 +1547,21 @@ class RenderNotifier:
                         # Time per frame and ETA calculations
                         self.precountdown = time.time() - self.precountdown
                         self.current_frame_time = self.precountdown
-                        self.countdown = int(time.time() + self.precountdown * (stepped_frames - self.counter))
                         self.current_countdown = int(time.time() + self.precountdown)
                         self.counter += 1
                         self.RENDER_CURRENT_FRAME = datetime.now() - self.RENDER_PRE_TIME
-                        self.average_est_frames.append(self.RENDER_CURRENT_FRAME) 
+                        slow_frame_median = self.record_frame_time(current_frame, self.RENDER_CURRENT_FRAME.total_seconds())
                         self.RENDER_PRE_TIME = datetime.now()
                         self.precountdown = time.time()
                         
-                        # Estimate remaining time
-                        if stepped_frames != self.counter:
-                            self.blender_data["est_render_job"] = str(self.RENDER_CURRENT_FRAME * (stepped_frames - self.counter))[:-4]
-                        else:
-                            self.blender_data["est_render_job"] = str(self.RENDER_CURRENT_FRAME * (stepped_frames - self.counter + 1))[:-4]
+                        # Estimate remaining time and frame time stats
+                        frames_left = stepped_frames - self.counter
+                        self.countdown = int(time.time() + self.eta_engine.estimate(frames_left)[0])
+                        self.blender_data.update(self.frame_stats.fields())
+                        self.blender_data.update(self.frame_sketch.fields())
+                        if slow_frame_median:
+                            self.notify_slow_frame(current_frame, self.RENDER_CURRENT_FRAME.total_seconds(), slow_frame_median)
+                        self.blender_data.update(self.eta_engine.fields(frames_left))
                             
                         # Update per-frame render data
                         self.blender_data["frame"] = current_frame
@@ -965,7 +1574,7 @@ class RenderNotifier:
                         
                         if self.is_discord:
                             try:
-                                self.send_webhook_non_blocking(frame=True,blender_data=self.blender_data)
+                                self.send_webhook_non_blocking(frame=True,slow_frame=bool(slow_frame_median),blender_data=self.blender_data)
                             except Exception as e:
                                 print(f"error in re_post when sending discord: {e}")
 
@@ -975,15 +1584,9 @@ class RenderNotifier:
                         
                 
                 
-                # Calculate running average frame render time 
-                avg = datetime.now() - datetime.now()
-                for est in self.average_est_frames:
-                    avg += est
-                avg /= len(self.average_est_frames)
-                frame = scene.frame_current
-                
-                self.average_time = avg
-                self.blender_data["average_time"] = str(self.average_time)[:-4]
+                # Running average frame render time in seconds
+                self.average_time = self.frame_stats.mean
+                self.blender_data["average_time"] = format_duration(self.average_time)
                 
                 if self.is_third_party_webhook and is_first_frame and self.third_party_webhook_first:
                     self.send_third_party_webhook(stage=1)
@@ -1012,10 +1615,20 @@ class RenderNotifier:
         #    # `self.rendered_frame_path` stores the absolute path of the currently rendered frame.
         #    # This is useful for saving or processing the rendered frame during the render process.
         #    self.rendered_frame_path = bpy.path.abspath(scene.render.frame_path())
-        try:
-            self.rendered_frame_path = bpy.path.abspath(scene.render.frame_path())
-        except Exception:
+        # movie outputs write every frame into one container, it is never used as a preview source
+        if scene.render.is_movie_format:
             self.rendered_frame_path = None
+        else:
+            try:
+                self.rendered_frame_path = bpy.path.abspath(scene.render.frame_path())
+            except Exception:
+                self.rendered_frame_path = None
+        if self.rendered_frame_path and self.readiness_watcher:
+            self.readiness_watcher.signal(self.rendered_frame_path)
+        if self.contact_sheet:
+            self.add_contact_sheet_frame(scene, self.rendered_frame_path)
+        if self.progress_preview:
+            self.queue_progress_preview()
     
     #handle render complete logic
     @persistent
@@ -1039,44 +1652,27 @@ class RenderNotifier:
         
         # Schedule save if needed
         def delayed_save():
-            try:
-                src = getattr(self, 'rendered_frame_path', None)
-                print(f"Rendered frame path: {src}")
-                if src and os.path.isfile(src):
-                    os.makedirs(os.path.dirname(self.final_path), exist_ok=True)
-                    shutil.copy2(src, self.final_path)
-                    print(f"✅ complete frame copied from: {src} -> {self.final_path}")
-                    self.send_webhook_non_blocking(finished=True,blender_data=self.blender_data)
-                    return None
-            except Exception as e:
-                print(f"⚠️ Failed to copy first frame: {e}")
-            
-            image = bpy.data.images.get('Render Result')
-            if image and image.has_data:
-                try:
-                    os.makedirs(os.path.dirname(self.final_path), exist_ok=True)
-                    image.save_render(self.final_path)
-                    #print(f"✅ Saved image to: {self.final_path}")
-                    if self.is_discord:
-                        self.send_webhook_non_blocking(finished=True,blender_data=self.blender_data)
-                except Exception as e:
-                    print(f"❌ Error saving image (complete): {e}")
-                    self.blender_data['no_preview'] = self.no_preview = True
-            else:
-                print("⚠️ Render Result not ready. (complete)")
+            send = lambda data: self.send_webhook_non_blocking(finished=True,blender_data=self.attach_contact_sheet(data))
+            if not self.save_preview('final_path', send):
+                self.blender_data['no_preview'] = self.no_preview = True
+                self.start_preview_worker().submit(send, dict(self.blender_data))
             return None
             
         if self.is_animation:
             # Update metadata
-            self.blender_data["average_time"] = str(self.average_time)[:-4]
-            self.blender_data["total_Est_time"] = str(self.RENDER_FIRST_FRAME * (self.total_frames / self.frame_step))[:-4]
+            self.export_frame_timeline()
+            self.blender_data["average_time"] = format_duration(self.average_time)
+            self.blender_data["total_Est_time"] = format_duration(self.average_time * (self.total_frames / self.frame_step))
             
         if self.discord_preview and self.is_discord:
-            bpy.app.timers.register(delayed_save, first_interval=0.2)
+            self.wait_for_output(self.rendered_frame_path, delayed_save)
         else:
             if self.is_discord:
                 self.send_webhook_non_blocking(finished=True,blender_data=self.blender_data)
         
+        if self.is_third_party_webhook and self.webhook_dispatcher:
+            # frames still waiting in a batch go out with the end of the job
+            self.webhook_dispatcher.flush()
         if self.is_third_party_webhook and self.third_party_webhook_completion:
             self.send_third_party_webhook(stage=2)
             
@@ -1123,46 +1719,28 @@ class RenderNotifier:
         
         # Schedule image saving if preview is requested
         def delayed_save():
-            try:
-                src = getattr(self, 'rendered_frame_path', None)
-                print(f"Rendered frame path: {src}")
-                if src and os.path.isfile(src):
-                    os.makedirs(os.path.dirname(self.final_path), exist_ok=True)
-                    shutil.copy2(src, self.final_path)
-                    print(f"✅ canceled frame copied from: {src} -> {self.final_path}")
-                    self.send_webhook_non_blocking(canceled=True,blender_data=self.blender_data)
-                    return None
-            except Exception as e:
-                print(f"⚠️ Failed to copy first frame: {e}")
-            
-            image = bpy.data.images.get('Render Result')
-            if image and image.has_data:
-                try:
-                    os.makedirs(os.path.dirname(self.final_path), exist_ok=True)
-                    image.save_render(self.final_path)
-                    #print(f"✅ Saved image to: {self.final_path}")
-                    
-                    if self.is_discord:
-                        self.send_webhook_non_blocking(canceled=True,blender_data=self.blender_data)
-                except Exception as e:
-                    print(f"❌ Error saving image (cancel): {e}")
-                    self.blender_data['no_preview'] = self.no_preview = True
-            else:
-                print("⚠️ Render Result not ready or missing (cancel).")
+            send = lambda data: self.send_webhook_non_blocking(canceled=True,blender_data=self.attach_contact_sheet(data))
+            if not self.save_preview('final_path', send):
+                self.blender_data['no_preview'] = self.no_preview = True
+                self.start_preview_worker().submit(send, dict(self.blender_data))
             return None
         
         if self.is_animation:
             # Handle animation render cancellation
+            self.export_frame_timeline()
             self.blender_data["current_frame"] = cancel_frame
             self.blender_data["total_frames_rendered"] = bpy.context.scene.frame_end - cancel_frame
             self.blender_data["frames_still_to_render_range"] = f"{cancel_frame} - {bpy.context.scene.frame_end}"
             self.blender_data["frames_still_to_render"] = f"{round((bpy.context.scene.frame_end - self.current_frame) / self.frame_step)}"
             
         if self.discord_preview and self.is_discord:
-            bpy.app.timers.register(delayed_save, first_interval=0.2)
+            self.wait_for_output(self.rendered_frame_path, delayed_save)
         elif self.is_discord:
             self.send_webhook_non_blocking(canceled=True,blender_data=self.blender_data)
             
+        if self.is_third_party_webhook and self.webhook_dispatcher:
+            # frames still waiting in a batch go out with the end of the job
+            self.webhook_dispatcher.flush()
         if self.is_third_party_webhook and self.third_party_webhook_cancel:
             self.send_third_party_webhook(stage=3)
             
@@ -1202,7 +1780,7 @@ class RenderNotifier:
                     payload = self.third_party_on_completion
                     
                     if self.is_third_party_simple_render_data and self.job_type == "Animation":
-                        payload += f"\nProject: {self.blender_data['project_name']}\nJob Type: {self.blender_data['job_type']}\nTotal Frames ({self.blender_data['frame_range']}): {self.blender_data['total_frames_stepped']}{step_frame}\nFirst Frame Time: {self.blender_data['RENDER_FIRST_FRAME']}\nRender Time: {self.blender_data['total_time_elapsed']}\nEst. Render Time: {self.blender_data['total_Est_time']}"
+                        payload += f"\nProject: {self.blender_data['project_name']}\nJob Type: {self.blender_data['job_type']}\nTotal Frames ({self.blender_data['frame_range']}): {self.blender_data['total_frames_stepped']}{step_frame}\nFirst Frame Time: {self.blender_data['RENDER_FIRST_FRAME']}\nRender Time: {self.blender_data['total_time_elapsed']}\nEst. Render Time: {self.blender_data['total_Est_time']}{self.frame_percentiles_text()}"
                     elif self.is_third_party_simple_render_data:
                         payload += f"\nProject: {self.blender_data['project_name']}\nJob Type: {self.blender_data['job_type']}\nFrame: {self.blender_data['frame']}\nRender Time: {self.blender_data['total_time_elapsed']}"
                 case 3: # cancel
@@ -1216,70 +1794,46 @@ class RenderNotifier:
                     payload = self.third_party_on_every
                     
                     if self.is_third_party_simple_render_data and self.job_type == "Animation":
-                        payload += f"\nProject: {self.blender_data['project_name']}\nJob Type: {self.blender_data['job_type']}\nTotal Frames ({self.blender_data['frame_range']}): {self.blender_data['total_frames_stepped']}{step_frame}\nFirst Frame Time: {self.blender_data['RENDER_FIRST_FRAME']}\nEst. Render Time: {self.blender_data['est_render_job']}"
+                        payload += f"\nProject: {self.blender_data['project_name']}\nJob Type: {self.blender_data['job_type']}\nTotal Frames ({self.blender_data['frame_range']}): {self.blender_data['total_frames_stepped']}{step_frame}\nFirst Frame Time: {self.blender_data['RENDER_FIRST_FRAME']}\nEst. Render Time: {self.blender_data['est_render_job']}{self.frame_percentiles_text()}"
+                case 5: # slow frame
+                    alert = self.blender_data['slow_frame']
+                    payload = f"Slow frame {alert['frame']}: {alert['time']}, {alert['factor']}x the median frame time ({alert['median']})"
+                    
+                    if self.is_third_party_simple_render_data:
+                        payload += f"\nProject: {self.blender_data['project_name']}{self.frame_percentiles_text()}"
                 
             print(payload)
         else:
-            blender_data = self.blender_data
-            blender_data.pop('discord_webhook_url', None)
-            blender_data.pop('discord_webhook_name', None)
-            blender_data.pop('discord_preview', None)
-            payload = blender_data
+            # copy the data without the discord settings, blender_data is still used by the discord worker
+            discord_keys = ('discord_webhook_url', 'discord_webhook_name', 'discord_preview')
+            payload = {k: v for k, v in self.blender_data.items() if k not in discord_keys}
+            if stage == 5:
+                payload["event"] = "slow_frame"
             print(payload)
-        import logging
-
-        # Configure logging
-        logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
-        logger = logging.getLogger(__name__)
-
-        try:
-            try:
-                response = requests.post(self.third_party_webhook_url, json=payload, timeout=10)
-                response.raise_for_status()
-            except requests.exceptions.Timeout:
-                logger.error("Third-party webhook request timed out.")
-            except requests.exceptions.ConnectionError:
-                logger.error("Failed to connect to the third-party webhook URL.")
-            except requests.exceptions.RequestException as e:
-                logger.error(f"An error occurred while sending the third-party webhook: {e}")
-            
-            if response.status_code == 200:
-                logger.info('Third-party webhook sent successfully!')
-            else:
-                logger.error(f'Failed to send third-party webhook. Status code: {response.status_code}')
-                logger.error(response.text)
-        except Exception as e:
-            logger.exception("Exception while sending third-party webhook.")
+        
+        # the post happens on the dispatcher thread, so a slow server never blocks the render
+        if not self.webhook_dispatcher:
+            print("⚠️ Third-party webhook dispatcher is not running. Skipping webhook.")
+            return
+        if not self.webhook_dispatcher.send(self.third_party_webhook_url, payload, droppable=(stage == 4), batch=(stage == 4)):
+            print(f"⚠️ Third-party webhook queue is full, dropped update for frame {self.current_frame}.")
+    
+    # Frame time percentiles for the simple third-party messages
+    def frame_percentiles_text(self):
+        if not self.blender_data.get('p50_frame_time'):
+            return ""
+        return f"\nFrame Time p50/p90/p99/max: {self.blender_data['p50_frame_time']} / {self.blender_data['p90_frame_time']} / {self.blender_data['p99_frame_time']} / {self.blender_data['max_frame_time']}"
     
+    # Queue a desktop notification, it is shown by the DesktopNotifier thread
     @persistent
     def notify_desktop(self, title, message):
         if not title or not message:
             print("⚠️ Title or message is missing for desktop notification.")
             return
-        #print("\n Notifying via desktop \n")
-        desktop_notify = Notify()
-        desktop_notify.title = title
-        desktop_notify.message = message
-        desktop_notify.application_name = "Blender Render Notifier"
-        
-        addon_dir = os.path.dirname(__file__)
-        icon_path = os.path.join(addon_dir, "resources", "images", "blender_logo.png")
-        if os.path.exists(icon_path):
-            desktop_notify.icon = icon_path
-        else:
-            print(f"⚠️ Icon file not found: {icon_path}")
-        
-        # Optionally play a custom sound if enabled
-        if self.is_custom_sound:
-            if os.path.isfile(self.desktop_sound_path):
-                desktop_notify.audio = self.desktop_sound_path
-            else:
-                print(f"⚠️ Custom sound file not found or inaccessible: {self.desktop_sound_path}")
-        
-        try:
-            desktop_notify.send()
-        except Exception as e:
-            print(f"⚠️ Failed to send desktop notification: {e}")
+        if not self.desktop_notifier:
+            print("⚠️ Desktop notifier is not running. Skipping notification.")
+            return
+        self.desktop_notifier.notify(title, message)
 
 notifier_instance = RenderNotifier()
 
@@ -1319,6 +1873,12 @@ def unregister():
         del bpy.types.Scene.render_panel_props
 
     if notifier_instance:
+        notifier_instance.stop_discord_worker()
+        notifier_instance.stop_webhook_dispatcher()
+        notifier_instance.stop_desktop_notifier()
+        notifier_instance.stop_preview_worker()
+        notifier_instance.stop_readiness_watcher()
+        
         # Safely remove handlers
         for handler_list, func in [
             (bpy.app.handlers.render_init, notifier_instance.render_init),
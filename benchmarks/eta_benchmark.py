@@ -0,0 +1,114 @@
+# This file is part of the Render Notifications plugin
+# https://github.com/JimmyNos/Render-Notifications
+# Copyright (c) 2023 Michael Mosako.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Replays frame time traces through every ETA estimator and scores how close and how steady the predicted finish was.
+# Runs with plain python, blender isn't needed:
+#   python benchmarks/eta_benchmark.py [trace.csv|trace.json ...] [--warmup N]
+# Traces are the frame timing exports (CSV with a "duration" column or JSON), or a file with one duration per line.
+# Without traces a set of synthetic jobs is used.
+
+import os
+import sys
+import csv
+import json
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from render_stats import ESTIMATORS, ETAEngine
+
+
+def load_trace(path):
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        frames = data.get("frames", data) if isinstance(data, dict) else data
+        return [float(frame["duration"]) if isinstance(frame, dict) else float(frame) for frame in frames]
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        first = f.readline()
+        f.seek(0)
+        if "duration" in first:
+            return [float(row["duration"]) for row in csv.DictReader(f)]
+        return [float(line) for line in f if line.strip()]
+
+
+def synthetic_traces(frames=300, seed=1):
+    rng = random.Random(seed)
+    noise = lambda base, spread: max(0.1, rng.gauss(base, spread))
+    return {
+        "steady": [noise(30, 2) for _ in range(frames)],
+        "warm-up spike": [120.0] + [noise(30, 2) for _ in range(frames - 1)],
+        "getting heavier": [noise(20 + 40 * i / frames, 2) for i in range(frames)],
+        "heavy section": [noise(80 if frames // 3 < i < frames // 2 else 25, 3) for i in range(frames)],
+        "noisy": [noise(30, 12) for _ in range(frames)],
+        "outliers": [noise(30, 2) * (8 if rng.random() < 0.03 else 1) for _ in range(frames)],
+    }
+
+
+# Predicted finish after every frame compared to the real one, as a share of the job's total time
+def score(trace, method, warmup):
+    engine = ETAEngine(method, warmup)
+    total = sum(trace)
+    elapsed = 0.0
+    errors, jumps, covered = [], [], 0
+    previous_finish = None
+    for i, seconds in enumerate(trace[:-1]):
+        engine.add(seconds)
+        elapsed += seconds
+        eta, low, high = engine.estimate(len(trace) - i - 1)
+        finish = elapsed + eta
+        errors.append(abs(finish - total) / total)
+        if previous_finish is not None:
+            jumps.append(abs(finish - previous_finish) / total)
+        previous_finish = finish
+        covered += low <= total - elapsed <= high
+    return {
+        "mean_error": 100 * sum(errors) / len(errors),
+        "max_error": 100 * max(errors),
+        "jitter": 100 * sum(jumps) / max(len(jumps), 1),
+        "coverage": 100 * covered / len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the ETA estimators on recorded frame time traces.")
+    parser.add_argument("traces", nargs="*", help="frame timing exports (CSV/JSON) or files with one duration per line")
+    parser.add_argument("--warmup", type=int, default=1, help="warm-up frames left out of the estimate")
+    parser.add_argument("--frames", type=int, default=300, help="length of the synthetic traces")
+    args = parser.parse_args()
+
+    traces = {os.path.basename(path): load_trace(path) for path in args.traces} or synthetic_traces(args.frames)
+    totals = {method: [] for method in ESTIMATORS}
+
+    print(f"{'trace':<20} {'estimator':<14} {'mean err %':>10} {'max err %':>10} {'jitter %':>9} {'in band %':>10}")
+    for name, trace in traces.items():
+        if len(trace) < 2:
+            print(f"{name:<20} skipped, needs at least 2 frames")
+            continue
+        for method in ESTIMATORS:
+            result = score(trace, method, args.warmup)
+            totals[method].append(result["mean_error"])
+            print(f"{name:<20} {method:<14} {result['mean_error']:>10.2f} {result['max_error']:>10.2f} "
+                  f"{result['jitter']:>9.3f} {result['coverage']:>10.1f}")
+
+    print()
+    for method, errors in sorted(totals.items(), key=lambda item: sum(item[1]) / max(len(item[1]), 1)):
+        if errors:
+            print(f"{method:<14} mean error over all traces: {sum(errors) / len(errors):.2f} %")
+
+
+if __name__ == "__main__":
+    main()
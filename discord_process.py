@@ -1,14 +1,31 @@
 import os
+import re
 import sys
-import json
 import time
+import hashlib
 import asyncio
+import threading
+import collections
 import aiohttp
 from discord import Webhook, Embed
 import discord
 
+import ipc_protocol
+from outbox import Outbox, backoff_delay
+
+# Largest chunk read from blender's pipe at once
+STDIN_READ_LIMIT = 2 ** 20
+
+
+# Attachment file name with the extension of the preview blender wrote (png, jpg or webp)
+def attachment_name(name, path):
+    return name + (os.path.splitext(path or "")[1] or ".png")
+
+
 class DiscordProcessor:
-    def __init__(self):
+    def __init__(self, worker=None):
+        # worker that owns the session and the cached webhook metadata
+        self.worker = worker
         # var
         self.init, self.frame, self.finished, self.canceled = False, False, False, False
         self.message_id = None
@@ -27,76 +44,32 @@ class DiscordProcessor:
         self.thumb_attach = None
         self.first_attach = None
         self.still_attach = None
+        self.progress_path = None
+        self.progress_attach = None
+        self.last_slow_frame = None
         
         self.is_step = False
+        self.first_frame = None
+        
+        # attachments already on the job's message, by (content hash, file name), so edits don't upload them again
+        self.uploaded = {}
+        self.upload_keys = {}
+        self.file_hashes = {}
 
-    async def run(self):
-        st_first = sys.stdin.readline().strip()
+    # Process one message sent by blender for this render job
+    async def process(self, webhook, data):
+        self.blender_data = data
+        if self.first_frame is None:
+            self.first_frame = self.blender_data.get('frame')
+        self.call_type()
+        self.discord_preview = self.blender_data.get('discord_preview')
+        self.final_path = self.blender_data.get('final_path')
+        self.no_preview = self.blender_data.get('no_preview', False)
+        self.no_first_preview = self.blender_data.get('no_first_preview', False)
         try:
-            try:
-                data = json.loads(st_first)
-            except json.JSONDecodeError:
-                data = {"raw": st_first}
-
-            response = {"received": f"first data received: {data}", "ack": True}
+            await self.send_or_update_embed(webhook, self.init, self.frame, self.finished, self.canceled)
         except Exception as e:
-            print(f"Error processing initial line: {e}")
-            
-        self.blender_data = data
-        self.discord_webhook_url = self.blender_data.get('discord_webhook_url')
-        self.first_frame = self.blender_data.get('frame')
-                
-                
-        async with aiohttp.ClientSession() as session:
-            webhook = Webhook.from_url(self.discord_webhook_url, session=session)
-
-            
-            self.call_type()
-            #await webhook.send(username="Blender Hook",content="test", wait=True)
-            try:
-                await self.send_or_update_embed(webhook, self.init, self.frame, self.finished, self.canceled)
-            except Exception as e:
-                print(f"Error sending or updating embed: {e}")
-        
-            # Loop reading JSON-lines from stdin and reply for each line.
-            for line in sys.stdin:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    data = json.loads(line)
-                except json.JSONDecodeError:
-                    data = {"raw": line}
-
-                response = {"received": f"data received. frame: {self.blender_data.get('frame')}", "ack": True}
-
-                # Allow the caller to request the child to exit
-                if isinstance(data, dict) and data.get("cmd") == "exit":
-                    break
-                
-                self.blender_data = data
-                self.call_type()
-                self.discord_preview = self.blender_data.get('discord_preview')
-                self.final_path = self.blender_data.get('final_path')
-                try:
-                    self.no_preview = self.blender_data.get('no_preview')
-                except KeyError:
-                    self.no_preview = False
-                try:
-                    self.no_first_preview = self.blender_data.get('no_first_preview')
-                except KeyError:
-                    self.no_first_preview = False
-                #await webhook.send(username="Blender Hook",content="test", wait=True)
-                try:
-                    await self.send_or_update_embed(webhook, self.init, self.frame, self.finished, self.canceled)
-                except Exception as e:
-                    print(f"Error sending or updating embed: {e}")
-                    
-                print(json.dumps(response), flush=True)
-                
-                if self.finished or self.canceled:
-                    break
-                
+            print(f"Error sending or updating embed: {e}")
         
     def call_type(self):
         if self.blender_data['call_type'] == 'render_init':
@@ -120,26 +93,6 @@ class DiscordProcessor:
             self.finished = False
             self.canceled = True
 
-    async def fetch_data(self, data):
-        # Loop reading JSON-lines from stdin and reply for each line. isfirst_frame
-        for line in sys.stdin:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                self.blender_data = json.loads(line)
-            except json.JSONDecodeError:
-                self.blender_data = {"raw": line}
-
-            response = {"received": "data received. processing..", "ack": True}
-            print(json.dumps(response), flush=True)
-        
-            # Allow the caller to request the child to exit
-            if isinstance(self.blender_data, dict) and self.blender_data.get("cmd") == "exit":
-                break
-            
-            await self.send_or_update_embed(self.webhook, self.init, self.frame, self.finished, self.canceled)
-
     # Load data into embeds
     def em_init(self,isAnimation):
         # create the embed messages 
@@ -184,6 +137,7 @@ class DiscordProcessor:
             self.animation_embed.add_field(name="Est. render job ", value="...", inline=True)
             self.animation_embed.add_field(name="Total est. time", value="...", inline=True)
             self.animation_embed.add_field(name="Total time elapsed", value="...", inline=True)
+            self.animation_embed.add_field(name="Frame time p50 / p90 / p99 / max", value="...", inline=False)
             self.animation_embed.set_footer(text="*(^◕.◕^)*")
             
             self.first_frame_embed.add_field(name="Job type", value=self.blender_data.get('job_type'), inline=False)
@@ -206,6 +160,34 @@ class DiscordProcessor:
             self.still_embed.add_field(name="Total time elapsed", value="...", inline=False)
             self.still_embed.set_footer(text="(。>︿<)_θ")
     
+    # Remaining time with its confidence band when blender sent one
+    def est_render_job_value(self):
+        est = self.blender_data.get('est_render_job')
+        band = self.blender_data.get('est_render_job_range')
+        return f"{est} ({band})" if band else est
+    
+    # Frame time percentiles sent by blender, shown in the last field of the animation embed
+    def set_percentile_field(self):
+        if not self.blender_data.get('p50_frame_time'):
+            return
+        value = " / ".join(self.blender_data.get(key) for key in ('p50_frame_time', 'p90_frame_time', 'p99_frame_time', 'max_frame_time'))
+        self.animation_embed.set_field_at(index=11, name="Frame time p50 / p90 / p99 / max", value=value, inline=False)
+    
+    # Post a separate message when blender flagged a frame as much slower than the median
+    async def send_slow_frame_alert(self, webhook):
+        alert = self.blender_data.get("slow_frame")
+        if not alert or alert.get("frame") == self.last_slow_frame:
+            return
+        self.last_slow_frame = alert.get("frame")
+        embed = Embed(title="Slow frame :snail:",
+                      description=f"Frame {alert.get('frame')} of {self.blender_data.get('project_name')} took {alert.get('time')}, "
+                                  f"{alert.get('factor')}x the median frame time ({alert.get('median')}).",
+                      colour=discord.Colour.orange())
+        message_link = await self.get_message_link(webhook)
+        if message_link:
+            embed.description += f"\n## {message_link}"
+        await self.send_message(webhook, username=self.blender_data.get("discord_webhook_name"), embed=embed)
+    
     # Load new data into embeds every time a frame is rendered
     def em_post(self,isAnimation):
         if isAnimation: 
@@ -218,7 +200,7 @@ class DiscordProcessor:
                     try:
                         if os.path.isfile(self.blender_data.get('final_first_path')):
                             self.thumb_path = self.blender_data.get('final_first_path')
-                            self.first_attach = "first_render.png"
+                            self.first_attach = attachment_name("first_render", self.thumb_path)
                             self.animation_embed.set_image(url="attachment://" + self.first_attach)
                             self.first_frame_embed.set_image(url="attachment://" + self.first_attach)
                         else:
@@ -233,20 +215,28 @@ class DiscordProcessor:
                     self.animation_embed.set_field_at(index=4,name="frames rendered", value=self.frames_rendered_field, inline=True)
                     self.animation_embed.set_field_at(index=5,name="Frame time", value=self.blender_data.get('RENDER_FIRST_FRAME'), inline=True)
                     self.animation_embed.set_field_at(index=6,name="Est. next frame", value=self.blender_data.get('next_frame_countdown'), inline=True)
-                    self.animation_embed.set_field_at(index=8,name=f"Est. render job {self.blender_data.get('countdown')}", value=self.blender_data.get('est_render_job'), inline=False)
+                    self.animation_embed.set_field_at(index=8,name=f"Est. render job {self.blender_data.get('countdown')}", value=self.est_render_job_value(), inline=False)
                     self.animation_embed.colour=discord.Colour.gold()
                     
                     self.animation_embed.set_footer(text= "(。>︿<)_θ")
                 except Exception as e:
                     print(f"An error occurred in en_post A1: {e}")
             else:
+                # periodic preview of the latest frame, replaces the previous one on the message
+                progress_path = self.blender_data.get('progress_path')
+                if self.discord_preview and progress_path and os.path.isfile(progress_path):
+                    self.progress_path = progress_path
+                    self.progress_attach = attachment_name("progress_render", progress_path)
+                    self.animation_embed.set_image(url="attachment://" + self.progress_attach)
+                    if self.thumb_path and self.first_attach:
+                        self.animation_embed.set_thumbnail(url="attachment://" + self.first_attach)
                 try:
                     self.animation_embed.set_field_at(index=3,name="Frame", value=self.blender_data.get('frame'), inline=False)
                     self.animation_embed.set_field_at(index=4,name="frames rendered", value=self.frames_rendered_field, inline=True)
                     self.animation_embed.set_field_at(index=5,name="Frame time", value=self.blender_data.get('RENDER_CURRENT_FRAME'), inline=True)
                     self.animation_embed.set_field_at(index=6,name="Est. next frame", value=self.blender_data.get('next_frame_countdown'), inline=True)
                     self.animation_embed.set_field_at(index=7,name="Avarage per frame", value=f"{self.blender_data.get('average_time')}", inline=True)
-                    self.animation_embed.set_field_at(index=8,name=f"Est. render job {self.blender_data.get('countdown')}", value=self.blender_data.get('est_render_job'), inline=False)
+                    self.animation_embed.set_field_at(index=8,name=f"Est. render job {self.blender_data.get('countdown')}", value=self.est_render_job_value(), inline=False)
                 except Exception as e:
                     print(f"An error occurred in en_post A2: {e}")    
     # Load new data into embeds when the render job is complete   final_first_path
@@ -258,7 +248,7 @@ class DiscordProcessor:
                         if os.path.isfile(self.final_path):
                             # set the image as the complete render
                             self.file_path = self.final_path
-                            self.attach = "complete_render.png"
+                            self.attach = attachment_name("complete_render", self.file_path)
                             self.animation_embed.set_image(url=None)
                             self.animation_embed.set_image(url="attachment://" + self.attach)
                         else:
@@ -268,7 +258,7 @@ class DiscordProcessor:
                             if os.path.isfile(self.blender_data.get('final_first_path')):
                                 # set the thumbnail as the first frame
                                 self.thumb_path = self.blender_data.get('final_first_path')
-                                self.thumb_attach = "first_render.png"
+                                self.thumb_attach = attachment_name("first_render", self.thumb_path)
                                 self.animation_embed.set_thumbnail(url="attachment://" + self.thumb_attach)
                             else:
                                 self.no_preview = True
@@ -292,7 +282,7 @@ class DiscordProcessor:
                     try: # try to upload the preview images
                         if os.path.isfile(self.final_path):
                             self.file_path = self.final_path
-                            self.still_attach = "complete_render.png"
+                            self.still_attach = attachment_name("complete_render", self.file_path)
                             self.still_embed.set_image(url="attachment://" + self.still_attach)
                         else:
                             self.no_preview = True
@@ -317,10 +307,10 @@ class DiscordProcessor:
                             if self.blender_data.get("frames_rendered", 0) > 1 and not self.no_first_preview:
                                 if os.path.isfile(self.blender_data.get('final_first_path')):
                                     self.thumb_path = self.blender_data.get('final_first_path')
-                                    self.thumb_attach = "first_render.png"
+                                    self.thumb_attach = attachment_name("first_render", self.thumb_path)
                                     self.animation_embed.set_thumbnail(url="attachment://" + self.thumb_attach)
                                     self.file_path = self.final_path
-                                    self.attach = "cencel_render.png"
+                                    self.attach = attachment_name("cencel_render", self.file_path)
                                     self.animation_embed.set_image(url="attachment://" + self.attach)
                                 else:
                                     self.no_preview = True
@@ -329,7 +319,7 @@ class DiscordProcessor:
                                     # set the image as the complete render
                                     self.animation_embed.set_image(url=None)
                                     self.file_path = self.final_path
-                                    self.attach = "cencel_render.png"
+                                    self.attach = attachment_name("cencel_render", self.file_path)
                                     self.animation_embed.set_image(url="attachment://" + self.attach)
                                 else:
                                     self.no_preview = True
@@ -357,7 +347,7 @@ class DiscordProcessor:
                 try: # try to upload the preview images
                     if os.path.isfile(self.final_path):
                         self.file_path = self.final_path
-                        self.still_attach = "cencel_render.png"
+                        self.still_attach = attachment_name("cencel_render", self.file_path)
                         self.still_embed.set_image(url="attachment://" + self.still_attach)
                     else:
                         self.no_preview = True
@@ -370,19 +360,124 @@ class DiscordProcessor:
             self.still_embed.set_footer(text="[X_ X)")
             self.still_embed.colour=discord.Colour.red()
 
+    # Webhook metadata (guild and channel id) used to link back to the main message.
+    # It is cached by the worker, so it is only fetched once per webhook instead of on every edit
+    async def get_webhook_info(self, webhook):
+        if self.worker:
+            return await self.worker.fetch_webhook_info(webhook)
+        return await webhook.fetch()
+    
+    async def get_message_link(self, webhook):
+        try:
+            full_hook = await self.get_webhook_info(webhook)
+        except Exception as e:
+            print(f"⚠️ Could not fetch webhook info for the message link: {e}")
+            return None
+        return f"https://discord.com/channels/{full_hook.guild_id}/{full_hook.channel_id}/{self.message_id}"
+    
     # Send a discord message when the render job is complete         
-    async def send_on_complete(self, full_hook=None, webhook=None):
-        message_link = f"https://discord.com/channels/{full_hook.guild_id}/{full_hook.channel_id}/{self.message_id}"
-        reply_content = f"{message_link}" # link to main message
-        self.complete_embed.description += f"\n## {reply_content}"
-        await webhook.send(username=self.blender_data.get("discord_webhook_name"), embed=self.complete_embed)
+    async def send_on_complete(self, webhook=None):
+        message_link = await self.get_message_link(webhook)
+        if message_link:
+            reply_content = f"{message_link}" # link to main message
+            self.complete_embed.description += f"\n## {reply_content}"
+        await self.send_message(webhook, username=self.blender_data.get("discord_webhook_name"), embed=self.complete_embed, **self.contact_sheet_file(self.complete_embed))
     
     # Send a discord message when the render job is canceled
-    async def send_on_cancel(self, full_hook=None, webhook=None):
-        message_link = f"https://discord.com/channels/{full_hook.guild_id}/{full_hook.channel_id}/{self.message_id}"
-        reply_content = f"{message_link}" # link to main message
-        self.cancel_embed.description += f"\n## {reply_content}"
-        await webhook.send(username=self.blender_data.get("discord_webhook_name"), embed=self.cancel_embed)
+    async def send_on_cancel(self, webhook=None):
+        message_link = await self.get_message_link(webhook)
+        if message_link:
+            reply_content = f"{message_link}" # link to main message
+            self.cancel_embed.description += f"\n## {reply_content}"
+        await self.send_message(webhook, username=self.blender_data.get("discord_webhook_name"), embed=self.cancel_embed, **self.contact_sheet_file(self.cancel_embed))
+    
+    # Show the contact sheet (thumbnails of every Nth frame) in the complete/cancel message if blender made one
+    def contact_sheet_file(self, embed):
+        path = self.blender_data.get("contact_sheet_path")
+        if not path or not os.path.isfile(path):
+            return {}
+        name = attachment_name("contact_sheet", path)
+        embed.set_image(url="attachment://" + name)
+        return {"file": discord.File(path, filename=name)}
+    
+    # Progress edits can be held back by the rate limiter, everything else uses the reserved budget
+    def is_terminal(self):
+        return not self.frame or self.blender_data.get("frames_rendered") == 1
+    
+    # sha256 of a preview file, cached until the file changes
+    def file_digest(self, path):
+        stat = os.stat(path)
+        cached = self.file_hashes.get(path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        self.file_hashes[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        return digest.hexdigest()
+    
+    # An attachment for the main message: the one already uploaded if the same bytes were sent before, a new upload otherwise
+    def attachment(self, path, filename):
+        key = (self.file_digest(path), filename)
+        if key in self.uploaded:
+            return self.uploaded[key]
+        self.upload_keys[filename] = key
+        return discord.File(path, filename=filename)
+    
+    # Remember the attachments discord stored for the files that were just uploaded
+    def remember_attachments(self, message, attachments):
+        stored = {attachment.filename: attachment for attachment in getattr(message, "attachments", None) or []}
+        for file in attachments:
+            if not isinstance(file, discord.File):
+                continue
+            key = self.upload_keys.pop(file.filename, None)
+            if key and file.filename in stored:
+                self.uploaded[key] = stored[file.filename]
+    
+    # Edit the main message, paced by the worker's rate limiter
+    async def edit_message(self, webhook, **kwargs):
+        if self.worker:
+            await self.worker.limiter.acquire(DiscordRateLimiter.edit_route(webhook), self.is_terminal())
+        message = await webhook.edit_message(self.message_id, **kwargs)
+        attachments = kwargs.get("attachments") or []
+        reused = sum(1 for a in attachments if isinstance(a, discord.Attachment))
+        if reused:
+            print(f"♻️ Reused {reused} uploaded attachment(s) instead of uploading them again")
+        self.remember_attachments(message, attachments)
+        return message
+    
+    # Send a new message, paced by the worker's rate limiter
+    async def send_message(self, webhook, **kwargs):
+        if self.worker:
+            await self.worker.limiter.acquire(DiscordRateLimiter.send_route(webhook), True)
+        return await webhook.send(**kwargs)
+    
+    # Journal the complete/cancel notification in the worker's outbox and return its id
+    def journal_terminal_event(self):
+        if not self.worker or not self.worker.outbox:
+            return None
+        is_animation = self.blender_data.get('job_type') == "Animation"
+        main_embed = getattr(self, 'animation_embed' if is_animation else 'still_embed', None)
+        final_embed = getattr(self, 'complete_embed' if self.finished else 'cancel_embed', None)
+        if final_embed is None:
+            return None
+        return self.worker.journal({
+            "url": self.discord_webhook_url,
+            "username": self.blender_data.get("discord_webhook_name"),
+            "message_id": self.message_id,
+            "edit_embed": main_embed.to_dict() if (self.message_id and main_embed) else None,
+            "send_embed": final_embed.to_dict(),
+        })
+    
+    def worker_call(self, name, event_id, *args):
+        if self.worker and event_id:
+            getattr(self.worker, name)(event_id, *args)
+    
+    # Drop the cached webhook metadata after an error, it is fetched again the next time it's needed
+    def forget_webhook_info(self, webhook):
+        if self.worker:
+            self.worker.webhook_info.pop(webhook.id, None)
     
     # Send a new discord message or edit embeded message
     async def send_or_update_embed(self, webhook, init=False, frame=False, finished=False, canceled=False):
@@ -406,76 +501,94 @@ class DiscordProcessor:
             else: 
                 self.em_cancel(False)
                 
+        if not init and self.blender_data.get('job_type') == "Animation":
+            try:
+                self.set_percentile_field()
+            except Exception as e:
+                print(f"An error occurred while setting the frame time percentiles: {e}")
+        
+        # complete/cancel messages are journaled before sending so they can be retried if discord can't be reached
+        event_id = self.journal_terminal_event() if (finished or canceled) else None
+                
         async def edit_still(has_attch = False):
             def _build_still_attachments():
                 attachments = []
                 if has_attch and getattr(self, 'file_path', None) and os.path.isfile(self.file_path):
-                    attachments.append(discord.File(self.file_path, filename=self.still_attach))
+                    attachments.append(self.attachment(self.file_path, self.still_attach))
                 return attachments
 
             if finished:
                 attachments = _build_still_attachments()
                 if attachments:
-                    await webhook.edit_message(self.message_id, embed=self.still_embed, attachments=attachments)
+                    await self.edit_message(webhook, embed=self.still_embed, attachments=attachments)
                 else:
-                    await webhook.edit_message(self.message_id, embed=self.still_embed)
+                    await self.edit_message(webhook, embed=self.still_embed)
 
-                await self.send_on_complete(full_hook, webhook)
+                await self.send_on_complete(webhook)
             elif canceled:
                 attachments = _build_still_attachments()
                 if attachments:
-                    await webhook.edit_message(self.message_id, embed=self.still_embed, attachments=attachments)
+                    await self.edit_message(webhook, embed=self.still_embed, attachments=attachments)
                 else:
-                    await webhook.edit_message(self.message_id, embed=self.still_embed)
+                    await self.edit_message(webhook, embed=self.still_embed)
 
-                await self.send_on_cancel(full_hook, webhook)
+                await self.send_on_cancel(webhook)
             else:
-                await webhook.edit_message(self.message_id, embed=self.still_embed)
+                await self.edit_message(webhook, embed=self.still_embed)
         
         async def edit_animation(has_attch = False):
             def _build_animation_attachments():
                 attachments = []
                 if has_attch and not self.no_first_preview and getattr(self, 'file_path', None) and os.path.isfile(self.file_path):
-                    attachments.append(discord.File(self.file_path, filename=self.attach))
+                    attachments.append(self.attachment(self.file_path, self.attach))
                     
                 if has_attch and not self.no_first_preview and getattr(self, 'thumb_path', None) and os.path.isfile(self.thumb_path):
-                    attachments.append(discord.File(self.thumb_path, filename=self.thumb_attach))
+                    attachments.append(self.attachment(self.thumb_path, self.thumb_attach))
+                
+                # keep the progress preview only while the embed still shows it
+                if self.progress_attach and self.animation_embed.image.url == "attachment://" + self.progress_attach:
+                    attachments.append(self.attachment(self.progress_path, self.progress_attach))
                     
                 return attachments
 
             if finished:
                 attachments = _build_animation_attachments()
                 if attachments:
-                    await webhook.edit_message(self.message_id, embed=self.animation_embed, attachments=attachments)
+                    await self.edit_message(webhook, embed=self.animation_embed, attachments=attachments)
                 else:
-                    await webhook.edit_message(self.message_id, embed=self.animation_embed)
+                    await self.edit_message(webhook, embed=self.animation_embed)
 
-                await self.send_on_complete(full_hook, webhook)
+                await self.send_on_complete(webhook)
             elif canceled:
                 attachments = _build_animation_attachments()
                 if attachments:
-                    await webhook.edit_message(self.message_id, embed=self.animation_embed, attachments=attachments)
+                    await self.edit_message(webhook, embed=self.animation_embed, attachments=attachments)
                 else:
-                    await webhook.edit_message(self.message_id, embed=self.animation_embed)
+                    await self.edit_message(webhook, embed=self.animation_embed)
 
-                await self.send_on_cancel(full_hook, webhook)
+                await self.send_on_cancel(webhook)
             elif self.blender_data.get("frames_rendered") == 1:
                 # only send thumbnail for the first frame
                 attachments = []
                 if has_attch and not self.no_first_preview and getattr(self, 'thumb_path', None) and os.path.isfile(self.thumb_path):
-                    attachments.append(discord.File(self.thumb_path, filename=self.first_attach))
+                    attachments.append(self.attachment(self.thumb_path, self.first_attach))
                 if attachments:
-                    await webhook.edit_message(self.message_id, embed=self.animation_embed, attachments=attachments)
+                    await self.edit_message(webhook, embed=self.animation_embed, attachments=attachments)
                 else:
-                    await webhook.edit_message(self.message_id, embed=self.animation_embed)
+                    await self.edit_message(webhook, embed=self.animation_embed)
+            elif self.progress_attach and self.progress_path and os.path.isfile(self.progress_path):
+                # the first frame stays as the thumbnail, the progress preview is only uploaded when it changed
+                attachments = [self.attachment(self.progress_path, self.progress_attach)]
+                if self.thumb_path and self.first_attach and os.path.isfile(self.thumb_path):
+                    attachments.append(self.attachment(self.thumb_path, self.first_attach))
+                await self.edit_message(webhook, embed=self.animation_embed, attachments=attachments)
             else:
-                await webhook.edit_message(self.message_id, embed=self.animation_embed)
+                await self.edit_message(webhook, embed=self.animation_embed)
         
         # Hanlde sending this discord webhook message
         if self.message_id:
             # If message_id is set, edit the existing message
             try:
-                full_hook = await webhook.fetch()
                 if self.blender_data.get('job_type') == "Animation": 
                     # If the preview is enabled, send the embed with the preview images
                     if self.discord_preview and not self.no_preview:
@@ -505,28 +618,370 @@ class DiscordProcessor:
                 # If the job is finished or canceled, clear the message_id                  
                 if canceled or finished:
                     self.message_id = None
+                    self.worker_call('delivered', event_id)
                     
             except aiohttp.ClientError as client_error:
                 print(f"⚠️ Client error occurred while updating message: {client_error}")
+                self.forget_webhook_info(webhook)
+                self.worker_call('retry_later', event_id)
             except discord.errors.HTTPException as http_error:
                 print(f"⚠️ HTTP error occurred while updating message: {http_error}")
+                self.forget_webhook_info(webhook)
+                self.worker_call('retry_later', event_id)
             except Exception as e:
                 print(f"⚠️ Unexpected error occurred while updating message: {e}")
+                self.worker_call('retry_later', event_id)
                 
         else: # if message_id is not set, send a new message
             try:
                 if self.blender_data.get('job_type') == "Animation": 
-                    msg = await webhook.send(embed=self.first_frame_embed, username=self.blender_data.get("discord_webhook_name"), wait=True)
+                    msg = await self.send_message(webhook, embed=self.first_frame_embed, username=self.blender_data.get("discord_webhook_name"), wait=True)
                     self.message_id = msg.id
                 else:
                     if self.blender_data.get("isfirst_frame"):
-                        msg = await webhook.send(embed=self.first_frame_embed, username=self.blender_data.get("discord_webhook_name"), wait=True)
+                        msg = await self.send_message(webhook, embed=self.first_frame_embed, username=self.blender_data.get("discord_webhook_name"), wait=True)
                     else:
-                        msg = await webhook.send(embed=self.still_embed, username=self.blender_data.get("discord_webhook_name"), wait=True)
+                        msg = await self.send_message(webhook, embed=self.still_embed, username=self.blender_data.get("discord_webhook_name"), wait=True)
                     self.message_id = msg.id
             except Exception as e:
                 print(f"⚠️ Error occurred while sending new message: {e}")
+            # there is no main message to finish, the worker sends the journaled complete/cancel message on its own
+            self.worker_call('retry_later', event_id, 0)
+        
+        if frame:
+            try:
+                await self.send_slow_frame_alert(webhook)
+            except Exception as e:
+                print(f"⚠️ Error occurred while sending slow frame alert: {e}")
     
 
+# Queue that only keeps the newest progress update of a job.
+# A render_post message waiting behind another one of the same job is merged into it, so each discord
+# edit shows the latest progress. Init, first-frame, complete and cancel messages are never merged or dropped.
+class CoalescingQueue:
+    def __init__(self):
+        self.items = collections.deque()
+        self.merged = 0
+        self._ready = asyncio.Event()
+
+    @staticmethod
+    def is_progress(data):
+        return (data is not None and data.get('call_type') == 'render_post'
+                and data.get('frames_rendered') != 1)
+
+    def put(self, data):
+        tail = self.items[-1] if self.items else None
+        if self.is_progress(data) and self.is_progress(tail) and tail.get('job_id') == data.get('job_id'):
+            tail.update(data)
+            self.merged += 1
+        else:
+            self.items.append(data)
+        self._ready.set()
+
+    async def get(self):
+        while not self.items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.items.popleft()
+
+    def __len__(self):
+        return len(self.items)
+
+
+# Paces discord requests using the rate limit headers of previous responses.
+# Discord sends X-RateLimit-Bucket/Remaining/Reset-After with every response, they are recorded per route
+# through an aiohttp trace hook. Progress edits wait while a bucket is down to its reserved requests, so
+# complete/cancel messages always have budget left. While a progress edit waits, newer progress updates
+# are merged into it by the CoalescingQueue.
+class DiscordRateLimiter:
+    def __init__(self, reserve=1):
+        self.reserve = reserve
+        self.routes = {}     # route -> bucket id reported by discord
+        self.buckets = {}    # bucket id -> [remaining, reset time (monotonic)]
+        self.deferred = 0
+        self.limited = 0
+
+    @staticmethod
+    def normalize_route(method, path):
+        path = re.sub(r"^/api/v\d+", "", path)
+        path = re.sub(r"/messages/\d+", "/messages/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def edit_route(webhook):
+        return f"PATCH /webhooks/{webhook.id}/{webhook.token}/messages/{{id}}"
+
+    @staticmethod
+    def send_route(webhook):
+        return f"POST /webhooks/{webhook.id}/{webhook.token}"
+
+    def trace_config(self):
+        config = aiohttp.TraceConfig()
+        config.on_request_end.append(self.on_request_end)
+        return config
+
+    async def on_request_end(self, session, context, params):
+        headers = params.response.headers
+        route = self.normalize_route(params.method, params.url.path)
+        bucket = headers.get("X-RateLimit-Bucket") or route
+        self.routes[route] = bucket
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset_after = float(headers["X-RateLimit-Reset-After"])
+        except (KeyError, ValueError):
+            return
+        if params.response.status == 429:
+            self.limited += 1
+            remaining = 0
+            reset_after = max(reset_after, float(headers.get("Retry-After", 0) or 0))
+        self.buckets[bucket] = [remaining, time.monotonic() + reset_after]
+
+    # Wait until the route's bucket has budget for one more request
+    async def acquire(self, route, terminal=False):
+        state = self.buckets.get(self.routes.get(route, route))
+        if state is None:
+            return
+        floor = 0 if terminal else self.reserve
+        wait = state[1] - time.monotonic()
+        if state[0] <= floor and wait > 0:
+            if not terminal:
+                self.deferred += 1
+            await asyncio.sleep(wait)
+            state[0] = None
+        if state[0] is not None:
+            # count the request until the response updates the bucket
+            state[0] -= 1
+
+
+# Long-lived worker that is started once per blender session and handles every render job.
+# It keeps one aiohttp session (and the webhooks created from it) open between jobs.
+class DiscordWorker:
+    def __init__(self, outbox=None):
+        self.outbox = outbox
+        self.retries = {}  # event id -> [due time (monotonic), attempt]
+        self.session = None
+        self.queue = None
+        self.webhooks = {}
+        self.webhook_info = {}
+        self.limiter = DiscordRateLimiter()
+        self.jobs = {}
+        self.states = {}
+
+    def get_webhook(self, url):
+        webhook = self.webhooks.get(url)
+        if webhook is None:
+            webhook = self.webhooks[url] = Webhook.from_url(url, session=self.session)
+        return webhook
+
+    # Fetch the webhook's metadata once and keep it for the lifetime of the worker
+    async def fetch_webhook_info(self, webhook):
+        info = self.webhook_info.get(webhook.id)
+        if info is None:
+            info = self.webhook_info[webhook.id] = await webhook.fetch()
+        return info
+
+    async def run(self):
+        async with aiohttp.ClientSession(trace_configs=[self.limiter.trace_config()]) as session:
+            self.session = session
+            self.queue = CoalescingQueue()
+            reader = await self.open_stdin_reader()
+            
+            # replay notifications that were not delivered before the last exit
+            if self.outbox:
+                for event_id, _ in self.outbox.events():
+                    self.retry_later(event_id, 0)
+            retry_task = asyncio.create_task(self.retry_outbox())
+            
+            # stdin is read on its own task so frames keep being received while discord requests are in flight
+            await asyncio.gather(self.read_messages(reader), self.consume())
+            retry_task.cancel()
+
+    def journal(self, payload):
+        try:
+            return self.outbox.add(payload)
+        except OSError as e:
+            print(f"⚠️ Could not write to the discord outbox: {e}")
+            return None
+
+    def delivered(self, event_id):
+        self.retries.pop(event_id, None)
+        self.outbox.done(event_id)
+
+    # Schedule another attempt with exponential backoff (or after the given delay)
+    def retry_later(self, event_id, delay=None):
+        if self.outbox.is_expired(event_id):
+            self.delivered(event_id)
+            return
+        attempt = self.retries.get(event_id, [0, 0])[1]
+        if delay is None:
+            delay = backoff_delay(attempt)
+            print(f"Retrying discord notification in {delay:.1f}s (attempt {attempt + 1}).")
+        self.retries[event_id] = [time.monotonic() + delay, attempt + 1]
+
+    # Background task that resends journaled notifications when they are due
+    async def retry_outbox(self):
+        while True:
+            now = time.monotonic()
+            for event_id, (due, _) in list(self.retries.items()):
+                if due > now:
+                    continue
+                record = self.outbox.pending.get(event_id)
+                if record is None:
+                    self.retries.pop(event_id, None)
+                    continue
+                try:
+                    await self.replay(record["payload"])
+                except Exception as e:
+                    print(f"⚠️ Retrying discord notification failed: {e}")
+                    self.retry_later(event_id)
+                else:
+                    self.delivered(event_id)
+            await asyncio.sleep(1.0)
+
+    # Resend a journaled complete/cancel notification: finish the main message, then send the final message
+    async def replay(self, payload):
+        webhook = self.get_webhook(payload["url"])
+        message_id = payload.get("message_id")
+        final_embed = Embed.from_dict(payload["send_embed"])
+        if message_id and payload.get("edit_embed"):
+            await self.limiter.acquire(DiscordRateLimiter.edit_route(webhook), True)
+            try:
+                await webhook.edit_message(message_id, embed=Embed.from_dict(payload["edit_embed"]))
+            except discord.errors.NotFound:
+                # the main message was deleted, the final message is still worth sending
+                print(f"⚠️ Message {message_id} no longer exists, only sending the final message.")
+            try:
+                info = await self.fetch_webhook_info(webhook)
+                final_embed.description += f"\n## https://discord.com/channels/{info.guild_id}/{info.channel_id}/{message_id}"
+            except Exception as e:
+                print(f"⚠️ Could not fetch webhook info for the message link: {e}")
+        await self.limiter.acquire(DiscordRateLimiter.send_route(webhook), True)
+        await webhook.send(username=payload.get("username"), embed=final_embed)
+
+    # Wrap stdin in an asyncio StreamReader so waiting for the next message never blocks the event loop
+    async def open_stdin_reader(self):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        if sys.platform != "win32":
+            try:
+                await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+                return reader
+            except (NotImplementedError, OSError, ValueError) as e:
+                print(f"⚠️ Could not attach stdin to the event loop ({e}). Falling back to a reader thread.")
+        
+        # anonymous pipes on windows can't be read asynchronously, so a thread feeds the stream instead
+        threading.Thread(target=self._feed_stdin, args=(loop, reader), daemon=True).start()
+        return reader
+    
+    def _feed_stdin(self, loop, reader):
+        fd = sys.stdin.fileno()
+        try:
+            while True:
+                chunk = os.read(fd, STDIN_READ_LIMIT)
+                if not chunk:
+                    break
+                loop.call_soon_threadsafe(reader.feed_data, chunk)
+        except Exception as e:
+            print(f"⚠️ Error reading stdin: {e}")
+        loop.call_soon_threadsafe(reader.feed_eof)
+
+    # Read ipc_protocol frames from stdin into the queue, each message is tagged with the job id it belongs to
+    async def read_messages(self, reader):
+        try:
+            while True:
+                frame = await ipc_protocol.read_frame(reader)
+                if frame is None:
+                    break
+                version, msg_type, encoding, body = frame
+                if version != ipc_protocol.PROTOCOL_VERSION:
+                    print(f"⚠️ Refusing message with protocol version {version} (expected {ipc_protocol.PROTOCOL_VERSION}).")
+                    continue
+                
+                # Allow the caller to request the worker to exit
+                if msg_type == ipc_protocol.MSG_EXIT:
+                    break
+                
+                try:
+                    payload = ipc_protocol.decode_payload(encoding, body)
+                except Exception as e:
+                    print(f"⚠️ Ignoring malformed message ({e}).")
+                    continue
+                
+                data = self.apply_message(msg_type, payload)
+                if data is not None:
+                    self.queue.put(data)
+        except Exception as e:
+            print(f"⚠️ Error reading messages from blender: {e}")
+        # let the consumer finish what is already queued before exiting
+        self.queue.put(None)
+
+    # Merge a job description or delta message into the job's state and return a copy of the full state
+    def apply_message(self, msg_type, payload):
+        if msg_type == ipc_protocol.MSG_STATE:
+            # full state message (delta encoding disabled in blender)
+            return payload
+        
+        job_id = payload.get("job_id")
+        if msg_type == ipc_protocol.MSG_JOB:
+            # blender renders one job at a time, so any other job state can be dropped
+            self.states = {job_id: dict(payload.get("data", {}))}
+        elif msg_type == ipc_protocol.MSG_DELTA:
+            state = self.states.get(job_id)
+            if state is None:
+                print(f"⚠️ Received delta for unknown job {job_id}. Skipping.")
+                return None
+            state.update(payload.get("data", {}))
+            for key in payload.get("unset", []):
+                state.pop(key, None)
+        else:
+            print(f"⚠️ Ignoring message with unknown type {msg_type}.")
+            return None
+        return dict(self.states[job_id])
+
+    # Send queued messages to discord one after another
+    async def consume(self):
+        while True:
+            data = await self.queue.get()
+            if data is None:
+                break
+            await self.dispatch(data)
+            # blender prints this line to its console, with the counters of the coalescing queue and rate limiter
+            print(f"ack: job {data.get('job_id')} frame {data.get('frame')} sent. queued: {len(self.queue)}, merged: {self.queue.merged}, deferred: {self.limiter.deferred}, rate limited: {self.limiter.limited}", flush=True)
+
+    async def dispatch(self, data):
+        job_id = data.get('job_id')
+        job = self.jobs.get(job_id)
+        if job is None:
+            if data.get('call_type') != 'render_init':
+                print(f"⚠️ Received '{data.get('call_type')}' for unknown job {job_id}. Skipping.")
+                return
+            # blender renders one job at a time, so any other job still open was abandoned
+            self.jobs.clear()
+            job = self.jobs[job_id] = DiscordProcessor(worker=self)
+        
+        url = data.get('discord_webhook_url') or job.discord_webhook_url
+        if not url:
+            print(f"⚠️ No discord webhook url for job {job_id}. Skipping.")
+            return
+        job.discord_webhook_url = url
+        
+        await job.process(self.get_webhook(url), data)
+        
+        # the job is done once the complete or cancel message was sent
+        if job.finished or job.canceled:
+            self.jobs.pop(job_id, None)
+
+
 if __name__ == '__main__':
-    asyncio.run(DiscordProcessor().run())
\ No newline at end of file
+    # blender passes the path of the outbox journal as the first argument
+    outbox = None
+    if len(sys.argv) > 1:
+        try:
+            outbox = Outbox(sys.argv[1])
+        except OSError as e:
+            print(f"⚠️ Could not open the discord outbox, failed notifications won't be retried: {e}")
+    try:
+        asyncio.run(DiscordWorker(outbox).run())
+    finally:
+        if outbox:
+            outbox.close()
\ No newline at end of file
@@ -0,0 +1,84 @@
+# This file is part of the Render Notifications plugin
+# https://github.com/JimmyNos/Render-Notifications
+# Copyright (c) 2023 Michael Mosako.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Framing used between blender and the discord worker (discord_process.py).
+# This module is imported by both sides, so it must not import bpy or anything from the addon.
+#
+# Every message is a fixed size header followed by the payload:
+#   payload length (uint32), schema version (uint8), message type (uint8), encoding (uint8)
+
+import json
+import marshal
+import struct
+import asyncio
+
+PROTOCOL_VERSION = 1
+
+HEADER = struct.Struct("!IBBB")
+
+# Largest payload either side will accept
+MAX_PAYLOAD_SIZE = 16 * 1024 * 1024
+
+# Message types
+MSG_STATE = 1   # full blender_data of a job (delta encoding disabled)
+MSG_JOB = 2     # full job description, sent once at the start of a job
+MSG_DELTA = 3   # keys changed since the last message of the job
+MSG_EXIT = 4    # ask the worker to exit
+
+# Payload encodings
+ENCODING_JSON = 0
+# marshal is only safe because blender starts the worker with its own interpreter (sys.executable)
+ENCODING_MARSHAL = 1
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(msg_type, payload=None, encoding=ENCODING_JSON):
+    if encoding == ENCODING_MARSHAL:
+        body = marshal.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    if len(body) > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"payload of {len(body)} bytes exceeds the {MAX_PAYLOAD_SIZE} byte limit")
+    return HEADER.pack(len(body), PROTOCOL_VERSION, msg_type, encoding) + body
+
+
+def decode_payload(encoding, body):
+    if encoding == ENCODING_MARSHAL:
+        return marshal.loads(body)
+    if encoding == ENCODING_JSON:
+        return json.loads(body.decode("utf-8"))
+    raise ProtocolError(f"unknown payload encoding {encoding}")
+
+
+# Read the next frame from an asyncio StreamReader.
+# Returns (version, msg_type, encoding, body) or None at end of stream.
+async def read_frame(reader):
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    length, version, msg_type, encoding = HEADER.unpack(header)
+    if length > MAX_PAYLOAD_SIZE:
+        # the stream can't be trusted to be in sync anymore
+        raise ProtocolError(f"frame of {length} bytes exceeds the {MAX_PAYLOAD_SIZE} byte limit")
+    try:
+        body = await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        return None
+    return version, msg_type, encoding, body
@@ -0,0 +1,213 @@
+# This file is part of the Render Notifications plugin
+# https://github.com/JimmyNos/Render-Notifications
+# Copyright (c) 2023 Michael Mosako.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Durable outbox for notifications that must not get lost (start, first frame, complete, cancel).
+# This module is imported by blender and by the discord worker, so it must not import bpy.
+#
+# Events are appended to a JSON-lines journal before they are sent:
+#   {"op": "add", "id": ..., "payload": ..., "created": ...}
+#   {"op": "done", "id": ...}
+# Events without a "done" line are replayed when the outbox is opened again (e.g. the next blender session).
+#
+# Several blender instances can run at the same time, so every process writes its own journal
+# (e.g. webhooks-1234-1a2b3c4d.jsonl for webhooks.jsonl) and holds a lock on it while it is open.
+# Journals whose lock can be taken belong to a process that has exited; their pending events are
+# adopted by the process that opens the outbox next, so each event is replayed exactly once.
+
+import os
+import glob
+import json
+import time
+import uuid
+import random
+import threading
+import collections
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+# Give up on events older than this
+MAX_EVENT_AGE = 24 * 60 * 60
+
+
+# Delay before the given retry attempt: exponential backoff with full jitter
+def backoff_delay(attempt, base=2.0, cap=300.0):
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# Open `path` and take an exclusive lock on it without waiting. Returns the open file, or None if
+# another process holds the lock. The lock is released when the file is closed or the process exits.
+def try_lock(path):
+    f = open(path, "a+b")
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Read a journal and return its pending "add" records in order
+def read_journal(path):
+    pending = collections.OrderedDict()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by a crash, everything before it is still valid
+                continue
+            if record.get("op") == "add":
+                pending[record["id"]] = record
+            elif record.get("op") == "done":
+                pending.pop(record.get("id"), None)
+    return pending
+
+
+class Outbox:
+    # `path` names the outbox (e.g. .../webhooks.jsonl), the journal of this process is stored next to it
+    def __init__(self, path, compact_after=50):
+        stem, ext = os.path.splitext(path)
+        self.name = path
+        self.path = f"{stem}-{os.getpid()}-{uuid.uuid4().hex[:8]}{ext}"
+        self.compact_after = compact_after
+        self.pending = collections.OrderedDict()
+        self.done_since_compact = 0
+        self.adopted = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file_lock = try_lock(self.path + ".lock")
+        if self._file_lock is None:
+            raise OSError(f"outbox journal {self.path} is locked by another process")
+        self._load()
+
+    def _load(self):
+        if os.path.isfile(self.path):
+            self.pending.update(read_journal(self.path))
+        self._adopt()
+
+        now = time.time()
+        for event_id, record in list(self.pending.items()):
+            if now - record.get("created", now) > MAX_EVENT_AGE:
+                print(f"⚠️ Dropping notification {event_id} from the outbox, it is older than {MAX_EVENT_AGE} seconds.")
+                del self.pending[event_id]
+        self.compact()
+
+    # Take over the pending events of journals left behind by processes that have exited
+    def _adopt(self):
+        stem, ext = os.path.splitext(self.name)
+        # the unsuffixed journal was written by versions that shared one file between processes
+        paths = [self.name] + glob.glob(glob.escape(stem) + "-*" + ext)
+        for path in paths:
+            if path == self.path or not os.path.isfile(path):
+                continue
+            lock = try_lock(path + ".lock")
+            if lock is None:
+                # still in use by another blender instance
+                continue
+            try:
+                # another process may have adopted it between the listing and taking the lock
+                if not os.path.isfile(path):
+                    continue
+                try:
+                    records = read_journal(path)
+                except OSError as e:
+                    print(f"⚠️ Could not read the outbox journal {path}: {e}")
+                    continue
+                for event_id, record in records.items():
+                    self.pending.setdefault(event_id, record)
+                self.adopted += len(records)
+                # the events must be in our journal before the old one is removed
+                self._compact()
+                remove_file(path)
+            finally:
+                lock.close()
+                remove_file(path + ".lock")
+        if self.adopted:
+            print(f"Adopted {self.adopted} undelivered notification(s) from earlier sessions.")
+
+    def _append(self, record):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Journal a new event and return its id
+    def add(self, payload):
+        record = {"op": "add", "id": uuid.uuid4().hex, "payload": payload, "created": time.time()}
+        with self._lock:
+            self._append(record)
+            self.pending[record["id"]] = record
+        return record["id"]
+
+    # Mark an event as delivered (or given up on)
+    def done(self, event_id):
+        with self._lock:
+            if self.pending.pop(event_id, None) is None:
+                return
+            self._append({"op": "done", "id": event_id})
+            self.done_since_compact += 1
+            if not self.pending or self.done_since_compact >= self.compact_after:
+                self._compact()
+
+    def events(self):
+        with self._lock:
+            return [(event_id, record["payload"]) for event_id, record in self.pending.items()]
+
+    def is_expired(self, event_id):
+        record = self.pending.get(event_id)
+        return record is None or time.time() - record.get("created", 0) > MAX_EVENT_AGE
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    # Rewrite the journal with only the pending events
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.pending.values():
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.done_since_compact = 0
+
+    # Release the journal. A journal without pending events is removed, anything else is replayed later.
+    def close(self):
+        with self._lock:
+            if self._file_lock is None:
+                return
+            if not self.pending:
+                remove_file(self.path)
+            self._file_lock.close()
+            self._file_lock = None
+            remove_file(self.path + ".lock")
@@ -0,0 +1,370 @@
+# This file is part of the Render Notifications plugin
+# https://github.com/JimmyNos/Render-Notifications
+# Copyright (c) 2023 Michael Mosako.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Preview images for discord: downscaling and encoding of rendered frames.
+# Everything here works on numpy arrays and runs on a background thread, so it must not use bpy.
+
+import io
+import os
+import math
+import zlib
+import struct
+import threading
+
+import numpy as np
+
+# Pillow is optional. Without it previews are always encoded as PNG.
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+# JPEG/WEBP encoding and animated contact sheets are only offered when Pillow can be imported
+HAS_PILLOW = PILImage is not None
+
+# Discord's attachment size limit without nitro
+DISCORD_ATTACHMENT_LIMIT = 10 * 1024 * 1024
+
+EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}
+
+# Lowest quality / size the adaptive encoder goes down to
+MIN_QUALITY = 40
+MIN_SIZE = 64
+
+# Rendered files that discord can show as they are, they skip decoding and encoding
+PASSTHROUGH_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG", ".webp": "WEBP"}
+
+# Containers blender's FFmpeg output writes, a frame can't be read from these while the render is running
+MOVIE_EXTENSIONS = {".mp4", ".mkv", ".mov", ".avi", ".webm", ".ogv", ".mpg", ".mpeg", ".dv", ".flv"}
+
+# Linux ioctl that clones a file's extents (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# Contact sheet tile size (longest side) and most tiles a sheet holds
+TILE_SIZE = 320
+MAX_TILES = 64
+
+# Curves used to turn linear HDR pixels (EXR) into an 8-bit preview
+TONEMAPS = ("STANDARD", "FILMIC")
+
+
+class PreviewSettings:
+    def __init__(self, max_size=1920, file_format="PNG", max_bytes=DISCORD_ATTACHMENT_LIMIT, quality=90,
+                 tonemap="STANDARD", exposure=0.0):
+        self.max_size = max_size          # longest side in pixels, 0 keeps the rendered size
+        self.file_format = file_format    # PNG, JPEG or WEBP
+        self.max_bytes = max_bytes
+        self.quality = quality
+        self.tonemap = tonemap            # curve for linear (float) images, one of TONEMAPS
+        self.exposure = exposure          # stops applied to linear images before the curve
+
+    # Format that will actually be written (JPEG/WEBP need Pillow)
+    @property
+    def output_format(self):
+        if self.file_format != "PNG" and not HAS_PILLOW:
+            return "PNG"
+        return self.file_format
+
+    @property
+    def extension(self):
+        return EXTENSIONS[self.output_format]
+
+
+# Reusable float32 buffers for captured pixels, so grabbing a frame on blender's main thread is a single copy
+# into memory that is already allocated. A buffer goes back to the pool once the preview worker is done with it.
+class BufferPool:
+    def __init__(self, keep=2):
+        self.keep = keep
+        self.free = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, size):
+        with self._lock:
+            if size not in self.free:
+                # resolution changed, buffers of the old size won't be used again
+                self.free.clear()
+            buffers = self.free.setdefault(size, [])
+            if buffers:
+                return buffers.pop()
+        return np.empty(size, dtype=np.float32)
+
+    def release(self, buffer):
+        # reshaped arrays are views of the pooled buffer
+        while buffer.base is not None:
+            buffer = buffer.base
+        with self._lock:
+            buffers = self.free.get(buffer.size)
+            if buffers is not None and len(buffers) < self.keep:
+                buffers.append(buffer)
+
+
+# Turn floats 0-1 into 8-bit RGB(A), the alpha channel is dropped when it's fully opaque
+def to_uint8(pixels):
+    if pixels.dtype != np.uint8:
+        pixels = (np.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+    if pixels.shape[2] == 4 and np.all(pixels[:, :, 3] == 255):
+        pixels = pixels[:, :, :3]
+    return np.ascontiguousarray(pixels)
+
+
+# Linear to sRGB transfer function
+def linear_to_srgb(rgb):
+    return np.where(rgb <= 0.0031308, rgb * 12.92, 1.055 * np.power(rgb, 1.0 / 2.4) - 0.055)
+
+
+# Filmic-like shoulder (Narkowicz's ACES fit), keeps highlights from clipping hard
+def filmic_curve(rgb):
+    return (rgb * (2.51 * rgb + 0.03)) / (rgb * (2.43 * rgb + 0.59) + 0.14)
+
+
+# Map linear HDR pixels to display referred 0-1 values, alpha is left untouched
+def tonemap(pixels, curve="STANDARD", exposure=0.0):
+    pixels = np.array(pixels, dtype=np.float32)
+    rgb = np.nan_to_num(pixels[:, :, :3], nan=0.0, posinf=0.0, neginf=0.0)
+    rgb = np.maximum(rgb * np.float32(2.0 ** exposure), 0.0)
+    if curve == "FILMIC":
+        rgb = filmic_curve(rgb)
+    pixels[:, :, :3] = linear_to_srgb(np.minimum(rgb, 1.0))
+    return pixels
+
+
+# Box filter downscale so the longest side is at most max_size
+def downscale(pixels, max_size):
+    height, width = pixels.shape[:2]
+    if not max_size or max(height, width) <= max_size:
+        return pixels
+    factor = math.ceil(max(height, width) / max_size)
+    height, width = height // factor * factor, width // factor * factor
+    blocks = pixels[:height, :width].reshape(height // factor, factor, width // factor, factor, -1)
+    return blocks.mean(axis=(1, 3), dtype=np.float32).astype(pixels.dtype)
+
+
+def _png_chunk(tag, data):
+    return struct.pack("!I", len(data)) + tag + data + struct.pack("!I", zlib.crc32(tag + data) & 0xffffffff)
+
+
+# Minimal PNG encoder (8-bit RGB/RGBA) so previews work without Pillow
+def encode_png(pixels, compress_level=6):
+    height, width, channels = pixels.shape
+    # "Up" filter on every row but the first, it compresses rendered images a lot better than no filter
+    rows = np.empty((height, width * channels + 1), dtype=np.uint8)
+    flat = pixels.reshape(height, width * channels)
+    rows[:, 0] = 2
+    rows[0, 0] = 0
+    rows[0, 1:] = flat[0]
+    rows[1:, 1:] = flat[1:] - flat[:-1]
+    color_type = 6 if channels == 4 else 2
+    header = struct.pack("!IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), compress_level))
+            + _png_chunk(b"IEND", b""))
+
+
+def encode_image(pixels, file_format, quality):
+    if file_format == "PNG":
+        if PILImage is None:
+            return encode_png(pixels)
+        buffer = io.BytesIO()
+        PILImage.fromarray(pixels).save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    if file_format == "JPEG" and pixels.shape[2] == 4:
+        pixels = pixels[:, :, :3]
+    buffer = io.BytesIO()
+    PILImage.fromarray(pixels).save(buffer, format=file_format, quality=quality)
+    return buffer.getvalue()
+
+
+# Downscale and encode pixels so the result fits in settings.max_bytes.
+# Linear pixels (float images such as EXR) are tonemapped after downscaling, so the curve runs on the small image.
+# JPEG/WEBP lower the quality first, then the size, PNG only lowers the size.
+# Returns (encoded bytes, file extension).
+def encode_preview(pixels, settings, linear=False):
+    image = downscale(pixels, settings.max_size)
+    if linear:
+        image = tonemap(image, settings.tonemap, settings.exposure)
+    # blender's pixel rows are stored bottom-up
+    return encode_fitted(to_uint8(image[::-1]), settings)
+
+
+# Encode an 8-bit image (top-down rows) in settings.output_format, lowering quality and size until it fits
+def encode_fitted(image, settings):
+    file_format = settings.output_format
+    while True:
+        quality = settings.quality
+        while True:
+            data = encode_image(image, file_format, quality)
+            if len(data) <= settings.max_bytes or file_format == "PNG" or quality <= MIN_QUALITY:
+                break
+            quality -= 10
+
+        if len(data) <= settings.max_bytes:
+            return data, EXTENSIONS[file_format]
+        height, width = image.shape[:2]
+        if max(height, width) <= MIN_SIZE:
+            raise ValueError(f"preview does not fit in {settings.max_bytes} bytes")
+        image = downscale(image, max(MIN_SIZE, max(height, width) // 2))
+
+
+# Thumbnails of every Nth frame of an animation, collected while the job renders.
+# Tiles are copied into one array allocated when the first tile arrives, so memory stays fixed however long the job is.
+class ContactSheet:
+    def __init__(self, total_frames, every=10, tile_size=TILE_SIZE, max_tiles=MAX_TILES):
+        self.every = max(1, every)
+        self.tile_size = tile_size
+        self.capacity = max(1, min(max_tiles, math.ceil(total_frames / self.every)))
+        self.columns = math.ceil(math.sqrt(self.capacity))
+        self.rows = math.ceil(self.capacity / self.columns)
+        self.tile_shape = None
+        self.sheet = None
+        self.frames = []
+
+    def wants(self, index):
+        return index % self.every == 0 and len(self.frames) < self.capacity
+
+    @property
+    def nbytes(self):
+        return 0 if self.sheet is None else self.sheet.nbytes
+
+    # Add a frame (blender's bottom-up float pixels). Runs on the preview worker.
+    def add(self, frame, pixels, settings, linear=False):
+        if len(self.frames) >= self.capacity:
+            return False
+        height, width = pixels.shape[:2]
+        if self.sheet is None:
+            scale = self.tile_size / max(height, width)
+            self.tile_shape = (max(1, round(height * scale)), max(1, round(width * scale)))
+            tile_height, tile_width = self.tile_shape
+            self.sheet = np.zeros((self.rows * tile_height, self.columns * tile_width, 3), dtype=np.uint8)
+        tile_height, tile_width = self.tile_shape
+
+        tile = downscale(pixels, max(self.tile_shape))
+        if linear:
+            tile = tonemap(tile, settings.tonemap, settings.exposure)
+        # nearest neighbour to the exact tile size, frames of another resolution still fit
+        rows = np.linspace(tile.shape[0] - 1, 0, tile_height).astype(np.intp)  # flips to top-down
+        columns = np.linspace(0, tile.shape[1] - 1, tile_width).astype(np.intp)
+        tile = tile[rows][:, columns]
+        if tile.dtype != np.uint8:
+            tile = (np.clip(tile, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+        if tile.shape[2] == 1:
+            tile = np.repeat(tile, 3, axis=2)
+
+        row, column = divmod(len(self.frames), self.columns)
+        self.sheet[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width] = tile[:, :, :3]
+        self.frames.append(frame)
+        return True
+
+    def tiles(self):
+        tile_height, tile_width = self.tile_shape
+        for i in range(len(self.frames)):
+            row, column = divmod(i, self.columns)
+            yield self.sheet[row * tile_height:(row + 1) * tile_height, column * tile_width:(column + 1) * tile_width]
+
+    # Encode the sheet as one grid image, or as an animated WebP/GIF (needs Pillow, falls back to the grid).
+    # Returns (encoded bytes, file extension).
+    def encode(self, settings, animated=False, frame_duration=200):
+        if not self.frames:
+            raise ValueError("contact sheet is empty")
+        if animated and PILImage is not None:
+            file_format = "GIF" if settings.output_format == "PNG" else "WEBP"
+            images = [PILImage.fromarray(np.ascontiguousarray(tile)) for tile in self.tiles()]
+            buffer = io.BytesIO()
+            images[0].save(buffer, format=file_format, save_all=True, append_images=images[1:],
+                           duration=frame_duration, loop=0, quality=settings.quality)
+            if len(buffer.getvalue()) <= settings.max_bytes:
+                return buffer.getvalue(), ".gif" if file_format == "GIF" else ".webp"
+            print("⚠️ Animated contact sheet is too large, sending a grid instead.")
+        # only the rows that hold tiles
+        used_rows = math.ceil(len(self.frames) / self.columns)
+        return encode_fitted(self.sheet[:used_rows * self.tile_shape[0]], settings)
+
+
+# Width and height of an image file from its header, or None if it can't be read without decoding
+def image_size(path):
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if header[:8] == b"\x89PNG\r\n\x1a\n" and header[12:16] == b"IHDR":
+        return struct.unpack("!II", header[16:24])
+    if PILImage is not None:
+        # Pillow only reads the header until the pixels are accessed
+        with PILImage.open(path) as image:
+            return image.size
+    return None
+
+
+def is_movie_file(path):
+    return os.path.splitext(path)[1].lower() in MOVIE_EXTENSIONS
+
+
+# Check if a rendered file can be sent as the preview without re-encoding it
+def can_pass_through(path, settings):
+    if PASSTHROUGH_FORMATS.get(os.path.splitext(path)[1].lower()) is None:
+        return False
+    try:
+        if os.path.getsize(path) > settings.max_bytes:
+            return False
+        size = image_size(path)
+    except Exception:
+        return False
+    return size is not None and (not settings.max_size or max(size) <= settings.max_size)
+
+
+# Clone src to dst with a reflink (copy on write, no data is copied)
+def reflink(src, dst):
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dst_file.close()
+            os.remove(dst)
+            raise
+
+
+# Make src available at dst without copying its data: hardlink, then reflink.
+# When neither works (other drive, network share, FAT...) the original file is referenced and uploaded directly.
+# Returns (path to upload, method).
+def link_preview(src, dst):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        # already linked (same frame sent again), renaming a link onto itself would be a no-op
+        return dst, "hardlink"
+    tmp_path = dst + ".tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    for method, link in (("hardlink", os.link), ("reflink", reflink)):
+        try:
+            link(src, tmp_path)
+        except OSError:
+            continue
+        # replacing dst only swaps the directory entry, the rendered file itself is never written to
+        os.replace(tmp_path, dst)
+        return dst, method
+    return src, "reference"
+
+
+# Write the file next to its final path first so discord never uploads a half written preview
+def write_preview(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,308 @@
+# This file is part of the Render Notifications plugin
+# https://github.com/JimmyNos/Render-Notifications
+# Copyright (c) 2023 Michael Mosako.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Frame time statistics of a render job. Everything here is updated once per frame in constant time and memory.
+# This module must not import bpy.
+
+import csv
+import json
+import math
+import array
+import collections
+
+# z score of the ETA's confidence band (90%)
+CONFIDENCE_Z = 1.645
+
+# Most frames a job's timeline keeps, older frames are overwritten (20 bytes per frame)
+MAX_TIMELINE_FRAMES = 100000
+
+
+# Same format as the other durations in blender_data (H:MM:SS.ss), built from the total seconds.
+# str(timedelta)[:-4] can't be used here, whole seconds have no fraction to cut off.
+def format_duration(seconds):
+    centiseconds = int(round(max(0.0, seconds) * 1e6)) // 10000
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{centiseconds // 100:02d}.{centiseconds % 100:02d}"
+
+
+# Running count, mean, variance (Welford), min/max and exponential moving average of frame times in seconds
+class FrameStats:
+    def __init__(self, ema_alpha=0.2):
+        self.ema_alpha = ema_alpha
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.ema = None
+        self.last = None
+
+    def add(self, seconds):
+        self.count += 1
+        delta = seconds - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (seconds - self.mean)
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        self.ema = seconds if self.ema is None else self.ema + self.ema_alpha * (seconds - self.ema)
+        self.last = seconds
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+    # Fields for blender_data
+    def fields(self):
+        if not self.count:
+            return {}
+        return {
+            "average_time": format_duration(self.mean),
+            "min_frame_time": format_duration(self.min),
+            "max_frame_time": format_duration(self.max),
+            "frame_time_stdev": format_duration(self.stdev),
+        }
+
+
+# Quantiles of frame times in bounded memory (logarithmic buckets, like DDSketch).
+# Any quantile is within relative_accuracy of the true value, at most max_buckets counters are kept.
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048, min_value=1e-3):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.max = value if self.max is None else max(self.max, value)
+        if value < self.min_value:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            # fold the two fastest buckets together, the slow end is what matters for frame times
+            lowest, second = sorted(self.buckets)[:2]
+            self.buckets[second] += self.buckets.pop(lowest)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                # middle of the bucket, at most relative_accuracy away from any value in it
+                return min(2 * self.gamma ** key / (self.gamma + 1), self.max)
+        return self.max
+
+    # Fields for blender_data
+    def fields(self):
+        if not self.count:
+            return {}
+        return {
+            "p50_frame_time": format_duration(self.quantile(0.5)),
+            "p90_frame_time": format_duration(self.quantile(0.9)),
+            "p99_frame_time": format_duration(self.quantile(0.99)),
+            "max_frame_time": format_duration(self.max),
+        }
+
+
+# ETA estimators. Each one predicts the time of the frames left from the frames rendered so far.
+# add() gets the frame's index in the job (0 = first rendered frame) and its duration in seconds.
+
+# Every frame left takes as long as the last one (what the addon always did)
+class LastFrameEstimator:
+    def __init__(self):
+        self.last = None
+
+    def add(self, index, seconds):
+        self.last = seconds
+
+    def remaining(self, index, frames_left):
+        return None if self.last is None else self.last * frames_left
+
+
+# Mean of the last frames with the slowest and fastest ones cut off
+class TrimmedMeanEstimator:
+    def __init__(self, window=50, trim=0.1):
+        self.trim = trim
+        self.window = collections.deque(maxlen=window)
+
+    def add(self, index, seconds):
+        self.window.append(seconds)
+
+    def remaining(self, index, frames_left):
+        if not self.window:
+            return None
+        ordered = sorted(self.window)
+        cut = int(len(ordered) * self.trim)
+        kept = ordered[cut:len(ordered) - cut] or ordered
+        return sum(kept) / len(kept) * frames_left
+
+
+# Exponential moving average, follows slow changes in frame time
+class EMAEstimator:
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.ema = None
+
+    def add(self, index, seconds):
+        self.ema = seconds if self.ema is None else self.ema + self.alpha * (seconds - self.ema)
+
+    def remaining(self, index, frames_left):
+        return None if self.ema is None else self.ema * frames_left
+
+
+# Least squares line of frame time over frame index, for shots that get heavier or lighter as they go
+class LinearTrendEstimator:
+    def __init__(self, min_frames=10):
+        # a line through a handful of noisy frames extrapolates wildly, the mean is used until then
+        self.min_frames = min_frames
+        self.n = 0
+        self.sum_x = self.sum_y = self.sum_xx = self.sum_xy = 0.0
+
+    def add(self, index, seconds):
+        self.n += 1
+        self.sum_x += index
+        self.sum_y += seconds
+        self.sum_xx += index * index
+        self.sum_xy += index * seconds
+
+    def remaining(self, index, frames_left):
+        if not self.n:
+            return None
+        mean_y = self.sum_y / self.n
+        if self.n < self.min_frames:
+            return mean_y * frames_left
+        denominator = self.n * self.sum_xx - self.sum_x ** 2
+        slope = (self.n * self.sum_xy - self.sum_x * self.sum_y) / denominator if denominator else 0.0
+        intercept = mean_y - slope * self.sum_x / self.n
+        # sum of the line over the frames left (index + 1 ... index + frames_left), frame times can't go negative
+        middle = index + (frames_left + 1) / 2
+        return max(0.0, (intercept + slope * middle) * frames_left)
+
+
+ESTIMATORS = {
+    "LAST": LastFrameEstimator,
+    "TRIMMED_MEAN": TrimmedMeanEstimator,
+    "EMA": EMAEstimator,
+    "TREND": LinearTrendEstimator,
+}
+
+
+# Remaining time of a job with a confidence band.
+# The first warmup frames (BVH build, kernel compile, texture caching) are left out once later frames exist.
+class ETAEngine:
+    def __init__(self, method="TRIMMED_MEAN", warmup=1):
+        self.method = method
+        self.warmup = max(0, warmup)
+        self.estimator = ESTIMATORS[method]()
+        self.warmup_estimator = ESTIMATORS[method]()
+        # spread of the frame times the estimate is based on
+        self.stats = FrameStats()
+        self.warmup_stats = FrameStats()
+        self.index = -1
+
+    def add(self, seconds):
+        self.index += 1
+        if self.index < self.warmup:
+            self.warmup_estimator.add(self.index, seconds)
+            self.warmup_stats.add(seconds)
+        else:
+            self.estimator.add(self.index, seconds)
+            self.stats.add(seconds)
+
+    # Returns (eta, low, high) in seconds, or None before the first frame
+    def estimate(self, frames_left):
+        frames_left = max(frames_left, 0)
+        estimator, stats = self.estimator, self.stats
+        if not stats.count:
+            estimator, stats = self.warmup_estimator, self.warmup_stats
+        eta = estimator.remaining(self.index, frames_left)
+        if eta is None:
+            return None
+        # frames vary independently around the mean and the mean itself is only known from stats.count frames
+        spread = CONFIDENCE_Z * stats.stdev * math.sqrt(frames_left + frames_left ** 2 / max(stats.count, 1))
+        return eta, max(0.0, eta - spread), eta + spread
+
+    # Fields for blender_data
+    def fields(self, frames_left):
+        estimate = self.estimate(frames_left)
+        if estimate is None:
+            return {}
+        eta, low, high = estimate
+        return {
+            "est_render_job": format_duration(eta),
+            "est_render_job_range": f"{format_duration(low)} - {format_duration(high)}",
+        }
+
+
+# Per-frame timings of a job in fixed size typed arrays used as a ring buffer (no per-frame objects).
+# Timestamps are unix times in seconds.
+class FrameTimeline:
+    def __init__(self, capacity=MAX_TIMELINE_FRAMES):
+        self.capacity = max(1, capacity)
+        self.frames = array.array("i", bytes(4 * self.capacity))
+        self.starts = array.array("d", bytes(8 * self.capacity))
+        self.ends = array.array("d", bytes(8 * self.capacity))
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.frames, self.starts, self.ends))
+
+    def add(self, frame, start, end):
+        i = self.count % self.capacity
+        self.frames[i] = frame
+        self.starts[i] = start
+        self.ends[i] = end
+        self.count += 1
+
+    # (frame, start, end, duration) oldest first
+    def rows(self):
+        first = self.count - len(self)
+        for n in range(first, self.count):
+            i = n % self.capacity
+            yield self.frames[i], self.starts[i], self.ends[i], self.ends[i] - self.starts[i]
+
+    def write_csv(self, path):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("frame", "start", "end", "duration"))
+            for frame, start, end, duration in self.rows():
+                writer.writerow((frame, f"{start:.3f}", f"{end:.3f}", f"{duration:.3f}"))
+
+    def write_json(self, path, **info):
+        frames = [{"frame": frame, "start": round(start, 3), "end": round(end, 3), "duration": round(duration, 3)}
+                  for frame, start, end, duration in self.rows()]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dict(info, frames_recorded=self.count, frames=frames), f, indent=1)
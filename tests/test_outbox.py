@@ -0,0 +1,144 @@
+# This file is part of the Render Notifications plugin
+# https://github.com/JimmyNos/Render-Notifications
+# Copyright (c) 2023 Michael Mosako.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Tests for the durable outbox journal (outbox.py). It doesn't import bpy, so these run outside of blender:
+#   python -m unittest discover -s tests
+
+import os
+import sys
+import json
+import glob
+import time
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outbox
+from outbox import Outbox, read_journal
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "webhooks.jsonl")
+        self.opened = []
+
+    def tearDown(self):
+        for box in self.opened:
+            box.close()
+        self.tmp.cleanup()
+
+    def open(self, **kwargs):
+        box = Outbox(self.path, **kwargs)
+        self.opened.append(box)
+        return box
+
+    def journals(self):
+        return sorted(glob.glob(os.path.join(self.tmp.name, "webhooks-*.jsonl")))
+
+    def test_add_and_done(self):
+        box = self.open()
+        first = box.add({"n": 1})
+        second = box.add({"n": 2})
+        self.assertEqual(box.events(), [(first, {"n": 1}), (second, {"n": 2})])
+
+        box.done(first)
+        box.done(first)  # marking an event twice is a no-op
+        self.assertEqual(box.events(), [(second, {"n": 2})])
+        self.assertEqual(list(read_journal(box.path)), [second])
+
+    def test_pending_events_are_replayed_once(self):
+        box = self.open()
+        event_id = box.add({"n": 1})
+        box.close()
+
+        replay = self.open()
+        self.assertEqual(replay.events(), [(event_id, {"n": 1})])
+        self.assertEqual(replay.adopted, 1)
+        # the old journal was taken over, a third session can't replay the event again
+        self.assertEqual(self.journals(), [replay.path])
+        self.assertEqual(self.open().events(), [])
+
+    def test_running_instances_keep_their_events(self):
+        first = self.open()
+        second = self.open()
+        self.assertNotEqual(first.path, second.path)
+
+        first_id = first.add({"from": "first"})
+        second_id = second.add({"from": "second"})
+        # compacting one journal must not touch the other instance's events
+        first.compact()
+        second.compact()
+        self.assertEqual(list(read_journal(first.path)), [first_id])
+        self.assertEqual(list(read_journal(second.path)), [second_id])
+
+        # a journal that is still locked is not adopted
+        third = self.open()
+        self.assertEqual(third.events(), [])
+
+    def test_compaction(self):
+        box = self.open(compact_after=2)
+        ids = [box.add({"n": n}) for n in range(3)]
+        box.done(ids[0])
+        with open(box.path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 4)
+        box.done(ids[1])
+        with open(box.path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["id"] for line in lines], [ids[2]])
+        self.assertEqual(box.done_since_compact, 0)
+
+    def test_close_removes_an_empty_journal(self):
+        box = self.open()
+        box.done(box.add({"n": 1}))
+        box.close()
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_truncated_line_is_ignored(self):
+        box = self.open()
+        event_id = box.add({"n": 1})
+        box.close()
+        with open(box.path, "a", encoding="utf-8") as f:
+            f.write('{"op": "add", "id": "cut sh')
+
+        self.assertEqual(self.open().events(), [(event_id, {"n": 1})])
+
+    def test_legacy_shared_journal_is_adopted(self):
+        record = {"op": "add", "id": "legacy", "payload": {"n": 1}, "created": time.time()}
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+        box = self.open()
+        self.assertEqual(box.events(), [("legacy", {"n": 1})])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_expired_events_are_dropped(self):
+        record = {"op": "add", "id": "old", "payload": {}, "created": time.time() - outbox.MAX_EVENT_AGE - 1}
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+        self.assertEqual(self.open().events(), [])
+
+    def test_backoff_delay_is_capped(self):
+        for attempt in range(20):
+            delay = outbox.backoff_delay(attempt, base=2.0, cap=30.0)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(30.0, 2.0 * 2 ** attempt))
+
+
+if __name__ == "__main__":
+    unittest.main()
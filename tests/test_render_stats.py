@@ -0,0 +1,47 @@
+# This file is part of the Render Notifications plugin
+# https://github.com/JimmyNos/Render-Notifications
+# Copyright (c) 2023 Michael Mosako.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Tests for the frame time statistics (render_stats.py). It doesn't import bpy, so these run outside of blender:
+#   python -m unittest discover -s tests
+
+import os
+import sys
+import unittest
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_stats import format_duration
+
+
+class FormatDurationTest(unittest.TestCase):
+    def test_whole_seconds(self):
+        self.assertEqual(format_duration(0), "0:00:00.00")
+        self.assertEqual(format_duration(5), "0:00:05.00")
+        self.assertEqual(format_duration(90.0), "0:01:30.00")
+
+    def test_matches_the_other_durations(self):
+        # blender_data formats the render timers as str(timedelta)[:-4]
+        for seconds in (0.5, 1.29, 61.123456, 3599.999, 7322.75):
+            self.assertEqual(format_duration(seconds), str(timedelta(seconds=seconds))[:-4])
+
+    def test_long_and_negative_durations(self):
+        self.assertEqual(format_duration(30 * 3600 + 1.5), "30:00:01.50")
+        self.assertEqual(format_duration(-1), "0:00:00.00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,529 @@
+# This file is part of the Render Notifications plugin
+# https://github.com/JimmyNos/Render-Notifications
+# Copyright (c) 2023 Michael Mosako.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+# Background threads used by the render handlers so that they only have to queue work and return.
+
+import os
+import json
+import gzip
+import time
+import heapq
+import logging
+import threading
+import collections
+
+import requests
+from notifypy import Notify
+
+from . import ipc_protocol
+from .outbox import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+
+# Bounded queue shared by the background workers.
+# When it is full the oldest droppable item is discarded, items queued with droppable=False are always kept.
+class DropOldestQueue:
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.items = collections.deque()
+        self.dropped = 0
+        self.closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def depth(self):
+        return len(self.items)
+
+    def put(self, item, droppable=True):
+        with self._cond:
+            if self.closed:
+                return False
+            if len(self.items) >= self.maxsize:
+                for i, (_, old_droppable) in enumerate(self.items):
+                    if old_droppable:
+                        del self.items[i]
+                        self.dropped += 1
+                        break
+                else:
+                    if droppable:
+                        # nothing older can be dropped, so drop the new item instead
+                        self.dropped += 1
+                        return False
+            self.items.append((item, droppable))
+            self._cond.notify()
+            return True
+
+    # Wait for the next item. Returns None once the queue is closed and empty, or on timeout.
+    def get(self, timeout=None):
+        with self._cond:
+            if not self.items and not self.closed:
+                self._cond.wait(timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()[0]
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+# Writes messages to the discord worker's stdin on a background thread.
+# Render handlers only queue a snapshot of the data, so a full pipe never stalls blender's main thread.
+#
+# Messages are written as ipc_protocol frames. With delta=True the full job description is only sent
+# once per job (MSG_JOB), later messages (MSG_DELTA) carry just the keys that changed since the last
+# message written for that job. Deltas are computed here at write time, so progress updates dropped
+# from the queue never lose changes.
+class PipeWriter(threading.Thread):
+    def __init__(self, process, maxsize=64, delta=True, encoding=ipc_protocol.ENCODING_JSON):
+        super().__init__(name="RenderNotifications-PipeWriter", daemon=True)
+        self.process = process
+        self.queue = DropOldestQueue(maxsize)
+        self.delta = delta
+        self.encoding = encoding
+        self.written = 0
+        self.bytes_written = 0
+        self.job_id = None
+        self.last_sent = {}
+
+    @property
+    def depth(self):
+        return self.queue.depth
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    # Progress updates are droppable, init/first frame/complete/cancel messages are not
+    def send(self, data, droppable=True):
+        return self.queue.put(data, droppable)
+
+    # Write the exit command after everything already queued, then close the pipe
+    def stop(self):
+        self.queue.put({"cmd": "exit"}, droppable=False)
+        self.queue.close()
+
+    # Turn queued data into a (message type, payload) pair
+    def encode(self, data):
+        if "cmd" in data:
+            return ipc_protocol.MSG_EXIT, None
+        if not self.delta:
+            return ipc_protocol.MSG_STATE, data
+        
+        job_id = data.get("job_id")
+        if job_id != self.job_id or data.get("call_type") == "render_init":
+            self.job_id = job_id
+            self.last_sent = data
+            return ipc_protocol.MSG_JOB, {"job_id": job_id, "data": data}
+        
+        changed = {k: v for k, v in data.items() if k not in self.last_sent or self.last_sent[k] != v}
+        unset = [k for k in self.last_sent if k not in data]
+        self.last_sent = data
+        payload = {"job_id": job_id, "data": changed}
+        if unset:
+            payload["unset"] = unset
+        return ipc_protocol.MSG_DELTA, payload
+
+    def run(self):
+        stdin = self.process.stdin
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.process.poll() is not None:
+                print(f"⚠️ Discord worker has exited (returncode={self.process.returncode}). Dropping queued messages.")
+                break
+            try:
+                msg_type, payload = self.encode(data)
+                frame = ipc_protocol.encode_frame(msg_type, payload, self.encoding)
+                stdin.write(frame)
+                stdin.flush()
+                self.written += 1
+                self.bytes_written += len(frame)
+            except (BrokenPipeError, OSError) as e:
+                print(f"⚠️ Error writing to discord worker: {e} (errno={getattr(e,'errno',None)}). The worker will be restarted on the next render job.")
+                break
+            except Exception as e:
+                print(f"Unexpected error writing to discord worker: {type(e).__name__}: {e}")
+        self.queue.close()
+        try:
+            stdin.close()
+        except Exception:
+            pass
+
+
+# Sends third-party webhook payloads (e.g. Home Assistant) on a background thread.
+# One requests.Session is kept for the whole blender session, so the connection is reused between posts.
+#
+# Durable payloads are journaled in the outbox by the dispatcher thread before they are sent. If sending them fails they are
+# retried with exponential backoff, and anything still pending is replayed when the dispatcher starts again.
+class WebhookDispatcher(threading.Thread):
+    def __init__(self, maxsize=64, timeout=10, outbox=None):
+        super().__init__(name="RenderNotifications-WebhookDispatcher", daemon=True)
+        self.queue = DropOldestQueue(maxsize)
+        self.timeout = timeout
+        self.outbox = outbox
+        self.session = requests.Session()
+        self.retries = []  # heap of (due time, event id, attempt)
+        self.sent = 0
+        self.failed = 0
+        
+        # every-frame payloads can be collected and posted together as one JSON array
+        self.batch_size = 1
+        self.batch_seconds = 0.0
+        self.batch_gzip = False
+        self.batch = []
+        self.batch_url = None
+        self.batch_deadline = None
+
+    @property
+    def depth(self):
+        return self.queue.depth
+
+    @property
+    def dropped(self):
+        return self.queue.dropped
+
+    # Post every-frame payloads in batches of up to `size` frames or every `seconds`, optionally gzipped.
+    # A size of 1 sends every frame on its own.
+    def set_batching(self, size=1, seconds=0.0, gzip_payload=False):
+        self.batch_size = max(1, size)
+        self.batch_seconds = max(0.0, seconds)
+        self.batch_gzip = gzip_payload
+
+    # Every-frame payloads are droppable, start/first frame/complete/cancel payloads are durable
+    # The payload is journaled on the dispatcher thread, so the fsync never blocks blender.
+    def send(self, url, payload, droppable=True, batch=False):
+        return self.queue.put((url, payload, not droppable, batch), droppable)
+
+    # Post the frames collected so far, e.g. when a job ends before the batch is full
+    def flush(self):
+        return self.queue.put((None, None, False, False), droppable=False)
+
+    def stop(self):
+        self.queue.close()
+
+    # Returns "sent", "retry" for errors worth retrying, or "failed"
+    def post(self, url, payload, compress=False):
+        try:
+            if compress:
+                body = gzip.compress(json.dumps(payload).encode("utf-8"))
+                headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+                response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+            else:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.Timeout:
+            logger.error("Third-party webhook request timed out.")
+        except requests.exceptions.ConnectionError:
+            logger.error("Failed to connect to the third-party webhook URL.")
+        except requests.exceptions.HTTPError as e:
+            logger.error(f"An error occurred while sending the third-party webhook: {e}")
+            status = e.response.status_code if e.response is not None else 0
+            if status != 429 and status < 500:
+                return "failed"
+        except requests.exceptions.RequestException as e:
+            logger.error(f"An error occurred while sending the third-party webhook: {e}")
+            return "failed"
+        else:
+            logger.info('Third-party webhook sent successfully!')
+            return "sent"
+        return "retry"
+
+    def journal(self, url, payload):
+        try:
+            return self.outbox.add({"url": url, "payload": payload})
+        except OSError as e:
+            print(f"⚠️ Could not write to the webhook outbox: {e}")
+            return None
+
+    def deliver(self, url, payload, event_id=None, attempt=0, compress=False):
+        try:
+            result = self.post(url, payload, compress)
+        except Exception:
+            logger.exception("Exception while sending third-party webhook.")
+            result = "failed"
+        
+        if result == "sent":
+            self.sent += 1
+        else:
+            self.failed += 1
+        if event_id is None:
+            return
+        if result == "retry" and not self.outbox.is_expired(event_id):
+            delay = backoff_delay(attempt)
+            print(f"Retrying third-party webhook in {delay:.1f}s (attempt {attempt + 1}).")
+            heapq.heappush(self.retries, (time.monotonic() + delay, event_id, attempt + 1))
+        else:
+            self.outbox.done(event_id)
+
+    def retry_due(self):
+        now = time.monotonic()
+        while self.retries and self.retries[0][0] <= now:
+            _, event_id, attempt = heapq.heappop(self.retries)
+            event = self.outbox.pending.get(event_id)
+            if event:
+                self.deliver(event["payload"]["url"], event["payload"]["payload"], event_id, attempt)
+
+    def add_to_batch(self, url, payload):
+        if self.batch and url != self.batch_url:
+            self.flush_batch()
+        if not self.batch:
+            self.batch_url = url
+            self.batch_deadline = time.monotonic() + self.batch_seconds if self.batch_seconds > 0 else None
+        self.batch.append(payload)
+        if len(self.batch) >= self.batch_size:
+            self.flush_batch()
+
+    def flush_batch(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        self.batch_deadline = None
+        self.deliver(self.batch_url, batch, compress=self.batch_gzip)
+
+    # How long the queue can be waited on before a retry or batch flush is due
+    def next_timeout(self):
+        due = [d for d in (self.retries[0][0] if self.retries else None, self.batch_deadline) if d is not None]
+        if not due:
+            return None
+        return max(0.0, min(due) - time.monotonic())
+
+    def run(self):
+        # replay payloads that were not delivered in a previous session
+        if self.outbox:
+            for event_id, _ in self.outbox.events():
+                heapq.heappush(self.retries, (time.monotonic(), event_id, 0))
+        
+        while True:
+            item = self.queue.get(self.next_timeout())
+            if item is not None:
+                url, payload, durable, batch = item
+                if url is None:
+                    self.flush_batch()
+                elif batch and self.batch_size > 1:
+                    self.add_to_batch(url, payload)
+                else:
+                    event_id = self.journal(url, payload) if durable and self.outbox else None
+                    # keep the order: frames collected so far go out before this payload
+                    self.flush_batch()
+                    self.deliver(url, payload, event_id)
+            elif self.queue.closed:
+                # pending retries stay in the outbox for the next session
+                self.flush_batch()
+                break
+            if self.batch_deadline is not None and time.monotonic() >= self.batch_deadline:
+                self.flush_batch()
+            self.retry_due()
+        self.session.close()
+        if self.outbox:
+            self.outbox.close()
+
+
+# Shows desktop notifications on a background thread.
+# The notifier is prepared once (icon, application name, sound checked once per job) and reused for every toast.
+# Notifications that arrive within `burst_window` seconds of each other are merged into one toast.
+class DesktopNotifier(threading.Thread):
+    def __init__(self, icon_path=None, burst_window=0.5, maxsize=16):
+        super().__init__(name="RenderNotifications-DesktopNotifier", daemon=True)
+        self.queue = DropOldestQueue(maxsize)
+        self.burst_window = burst_window
+        self.sent = 0
+        self.merged = 0
+        
+        self.notifier = Notify()
+        self.notifier.application_name = "Blender Render Notifier"
+        if icon_path and os.path.exists(icon_path):
+            self.notifier.icon = icon_path
+        else:
+            print(f"⚠️ Icon file not found: {icon_path}")
+        self.default_audio = self.notifier.audio
+
+    # Use a custom '.wav' file for the notification sound, or the default sound if path is None
+    def set_sound(self, path=None):
+        if path and not os.path.isfile(path):
+            print(f"⚠️ Custom sound file not found or inaccessible: {path}")
+            path = None
+        try:
+            self.notifier.audio = path if path else self.default_audio
+        except Exception as e:
+            print(f"⚠️ Failed to set custom sound file: {e}")
+            self.notifier.audio = self.default_audio
+
+    def notify(self, title, message):
+        return self.queue.put((title, message), droppable=False)
+
+    def stop(self):
+        self.queue.close()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            burst = [item]
+            # collect anything else that arrives shortly after, e.g. start and first frame of a fast render
+            while True:
+                item = self.queue.get(self.burst_window)
+                if item is None:
+                    break
+                burst.append(item)
+            
+            if len(burst) == 1:
+                title, message = burst[0]
+            else:
+                self.merged += len(burst) - 1
+                title = burst[-1][0]
+                message = "\n\n".join(f"{t}\n{m}" for t, m in burst)
+            try:
+                self.notifier.title = title
+                self.notifier.message = message
+                self.notifier.send()
+                self.sent += 1
+            except Exception as e:
+                print(f"⚠️ Failed to send desktop notification: {e}")
+
+
+# Runs preview work (downscaling, encoding, writing files) off blender's main thread.
+class PreviewWorker(threading.Thread):
+    def __init__(self, maxsize=8):
+        super().__init__(name="RenderNotifications-PreviewWorker", daemon=True)
+        self.queue = DropOldestQueue(maxsize)
+
+    @property
+    def depth(self):
+        return self.queue.depth
+
+    def submit(self, task, *args, droppable=False):
+        return self.queue.put((task, args), droppable)
+
+    def stop(self):
+        self.queue.close()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            task, args = item
+            try:
+                task(*args)
+            except Exception as e:
+                print(f"⚠️ Error in preview worker: {type(e).__name__}: {e}")
+
+
+# Waits for rendered frames to be completely written before a preview is made from them, without blocking blender.
+# A file is ready when blender's render_write handler reported it (signal), or when its size and mtime stop
+# changing after the watch started. Checks back off from first_delay to max_delay, a watch gives up after timeout.
+# Callbacks must run on blender's main thread, so ready watches are queued and run_ready() is called from a bpy timer.
+class ReadinessWatcher(threading.Thread):
+    def __init__(self, first_delay=0.01, max_delay=0.25):
+        super().__init__(name="RenderNotifications-ReadinessWatcher", daemon=True)
+        self.first_delay = first_delay
+        self.max_delay = max_delay
+        self.watches = []
+        self.written = set()
+        self.ready = collections.deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self.watches) + len(self.ready)
+
+    # Call callback(status) on the main thread once path is ready. A path of None is ready right away.
+    def watch(self, path, callback, timeout=10.0):
+        now = time.monotonic()
+        watch = {"path": path, "callback": callback, "start": now, "wall_start": time.time(),
+                 "deadline": now + timeout, "next": now, "delay": self.first_delay, "last": None}
+        with self._cond:
+            self.watches.append(watch)
+            self._cond.notify()
+
+    # Blender finished writing path (render_write handler)
+    def signal(self, path):
+        with self._cond:
+            self.written.add(path)
+            self._cond.notify()
+
+    # Forget written paths of the previous job
+    def reset(self):
+        with self._cond:
+            self.written.clear()
+
+    def stop(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    # Run the callbacks of ready watches. Main thread only.
+    def run_ready(self):
+        while True:
+            with self._cond:
+                if not self.ready:
+                    return
+                watch, status = self.ready.popleft()
+            print(f"⏱️ Preview source {status} after {(watch['ready'] - watch['start']) * 1000:.0f} ms: {watch['path']}")
+            try:
+                watch["callback"](status)
+            except Exception as e:
+                print(f"⚠️ Error in preview callback: {type(e).__name__}: {e}")
+
+    # Check a watch, returns "written", "stable", "timeout" or None if it's not ready yet
+    def check(self, watch, now, written):
+        path = watch["path"]
+        if path is None or path in written:
+            return "written"
+        if now >= watch["deadline"]:
+            return "timeout"
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        current = (stat.st_size, stat.st_mtime_ns)
+        # a file left over from an earlier render is stable too, it only counts once it was modified during the watch
+        stable = current == watch["last"] and stat.st_size > 0 and stat.st_mtime >= watch["wall_start"]
+        watch["last"] = current
+        return "stable" if stable else None
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self.watches:
+                    self._cond.wait()
+                if self._closed:
+                    break
+                now = time.monotonic()
+                due = [w for w in self.watches if now >= w["next"] or w["path"] in self.written]
+                written = set(self.written)
+
+            # stat outside the lock, a slow disk must not block the render handlers
+            results = [(watch, self.check(watch, now, written)) for watch in due]
+
+            with self._cond:
+                for watch, status in results:
+                    if status:
+                        watch["ready"] = time.monotonic()
+                        self.watches.remove(watch)
+                        self.ready.append((watch, status))
+                    else:
+                        watch["next"] = now + watch["delay"]
+                        watch["delay"] = min(watch["delay"] * 2, self.max_delay)
+                if self.watches and not self._closed:
+                    self._cond.wait(max(0.0, min(w["next"] for w in self.watches) - time.monotonic()))